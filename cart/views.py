@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Cart, CartItem
 from products.models import Product, ProductVariation
+from products.view_counter import record_add_to_cart
+from products.clickstream import capture_event
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib import messages
 import json
@@ -95,6 +97,8 @@ def add_cart(request, product_id):
             if existing_item.quantity < available_stock:
                 existing_item.quantity += 1
                 existing_item.save()
+                record_add_to_cart(product.id)
+                capture_event('cart', request, product_id=product.id, quantity=1)
                 success_message = f"{product.name} added to cart!"
                 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -126,6 +130,8 @@ def add_cart(request, product_id):
                 if selected_variations:
                     cart_item.variations.set(selected_variations)
                     cart_item.save()
+                record_add_to_cart(product.id)
+                capture_event('cart', request, product_id=product.id, quantity=1)
                 
                 success_message = f"{product.name} added to cart!"
                 
@@ -80,6 +80,7 @@ TEMPLATES = [
                 'products.context_processor.categories',
                 'cart.context_processor.counter',
                 'banners.context_processors.active_banners',
+                'users.context_processors.notifications',
             ],
         },
     },
@@ -181,6 +182,7 @@ MESSAGE_TAGS={
 ESEWA_PRODUCT_CODE = "EPAYTEST"
 ESEWA_SECRET_KEY = "8gBm/:&EnhH.1/q"
 ESEWA_FORM_URL = "https://rc-epay.esewa.com.np/api/epay/main/v2/form"
+ESEWA_STATUS_URL = "https://rc.esewa.com.np/api/epay/transaction/status/"
 
 ESEWA_SETTINGS = {
     'PRODUCT_CODE': ESEWA_PRODUCT_CODE,
@@ -188,11 +190,57 @@ ESEWA_SETTINGS = {
     'FORM_URL': ESEWA_FORM_URL,
     'SUCCESS_URL': 'http://127.0.0.1:8000/orders/esewa-return/',
     'FAILURE_URL': 'http://127.0.0.1:8000/orders/esewa-return/',
+    'STATUS_URL': ESEWA_STATUS_URL,
+    'VERIFY_TIMEOUT': (3.05, 10),  # (connect, read) seconds
+    'VERIFY_RETRIES': 3,
+    'VERIFY_POOL_SIZE': 10,
 }
 
 
 
 PAYMENT_TESTING_MODE = True
+
+# Product views are buffered in memory and flushed to the database by a background thread this often (seconds)
+PRODUCT_VIEW_FLUSH_INTERVAL = 60
+
+# Dashboards, unread counts, typing indicators and the chat/notification stream wake-ups live
+# in the cache, so it must be shared by every worker process. Set REDIS_URL (needs the redis
+# package) when running several workers; the in-memory default only suits a single process
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'marketplace',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Per-user dashboard data is cached this long (seconds) and invalidated on changes
+DASHBOARD_CACHE_TTL = 60
+
+# Clickstream events (view/cart/checkout/order/paid) are appended to rotating JSONL files
+# by a background thread; analyse them offline with `manage.py clickstream_funnel`
+CLICKSTREAM_ENABLED = True
+CLICKSTREAM_DIR = BASE_DIR / 'clickstream'
+CLICKSTREAM_MAX_BYTES = 64 * 1024 * 1024
+
+# Open chats receive messages and typing changes over Server-Sent Events when the site is
+# served by an ASGI server (e.g. `uvicorn marketplace.asgi:application`); under WSGI they poll.
+# Each stream is closed after CHAT_STREAM_MAX_SECONDS and the browser reconnects
+CHAT_STREAM_ENABLED = True
+CHAT_STREAM_MAX_SECONDS = 300
+
+# Likewise every page of a logged-in user receives new notifications and the unread count
+# over one stream under ASGI. The unread count itself is cached and dropped on every change
+NOTIFICATION_STREAM_ENABLED = True
+NOTIFICATION_STREAM_MAX_SECONDS = 300
 DEFAULT_FROM_EMAIL = 'noreply@marketplace.com'
 
 # =============================================================================
@@ -1,6 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponse
 from products.models import Product
+from products.rankings import bestsellers
 from blog.models import Blog
 from pages.models import Page
 from cart.models import Cart
@@ -20,6 +21,7 @@ def home(request):
 
     context = {
         'products':products,
+        'bestsellers': bestsellers(limit=8),
         # 'banners': banners,
         # 'categories': categories
     }
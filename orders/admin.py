@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Order, OrderItem, Payment
+from .models import Order, OrderItem, Payment, SalesEvent
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -117,39 +117,18 @@ class OrderAdmin(admin.ModelAdmin):
     # NEW QR Payment verification actions
     def verify_qr_payment(self, request, queryset):
         """Verify QR payments"""
-        from .views import send_order_confirmation_email
+        from .qr_verification import bulk_verify_qr_payments
         
-        count = 0
-        for order in queryset.filter(payment_method='QR Payment', payment_status='pending_verification'):
-            order.payment_status = 'completed'
-            order.status = 'Confirmed'
-            order.order_status = 'confirmed'
-            order.qr_payment_verified_by = request.user
-            order.qr_payment_verified_at = timezone.now()
-            order.save()
-            
-            # Send confirmation email
-            try:
-                send_order_confirmation_email(order)
-            except Exception as e:
-                print(f"Error sending email for order {order.id}: {e}")
-            
-            count += 1
-        
-        self.message_user(request, f'Successfully verified {count} QR payments and sent confirmation emails')
+        orders = bulk_verify_qr_payments(list(queryset.values_list('id', flat=True)), verified_by=request.user)
+        self.message_user(request, f'Successfully verified {len(orders)} QR payments and sent confirmation emails')
     verify_qr_payment.short_description = "✅ Verify selected QR payments"
     
     def reject_qr_payment(self, request, queryset):
         """Reject QR payments"""
-        count = 0
-        for order in queryset.filter(payment_method='QR Payment', payment_status='pending_verification'):
-            order.payment_status = 'rejected'
-            order.status = 'Payment Rejected'
-            order.order_status = 'cancelled'
-            order.save()
-            count += 1
+        from .qr_verification import bulk_reject_qr_payments
         
-        self.message_user(request, f'Rejected {count} QR payments. Customers will need to be notified manually.')
+        orders = bulk_reject_qr_payments(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f'Rejected {len(orders)} QR payments. Stock reverted and customers notified.')
     reject_qr_payment.short_description = "❌ Reject selected QR payments"
 
 
@@ -182,4 +161,17 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ('payment_id', 'user', 'payment_method', 'amount_paid', 'status', 'created_at')
     list_filter = ('payment_method', 'status', 'created_at')
     search_fields = ('payment_id', 'user__username', 'user__email')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+@admin.register(SalesEvent)
+class SalesEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'product', 'seller', 'kind', 'quantity', 'revenue', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('product__name', 'seller__username', 'order__order_number')
+    readonly_fields = ('order_item', 'order', 'product', 'seller', 'kind', 'sign', 'quantity', 'revenue', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
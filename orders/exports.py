@@ -0,0 +1,90 @@
+# orders/exports.py
+import csv
+import json
+
+from .models import Order, OrderItem, Payment, effective_status_expression
+
+# Rows are pulled from the database in chunks of this size, so an export of
+# any length keeps only one chunk in memory at a time
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = {
+    'orders': [
+        'id', 'order_number', 'user__username', 'user__email', 'created_at',
+        'status', 'order_status', 'payment_method', 'payment_status',
+        'total', 'tax', 'grand_total', 'city', 'country', 'tracking_number',
+    ],
+    'items': [
+        'id', 'order_id', 'order__order_number', 'order__created_at',
+        'order__status', 'order__order_status', 'product_id', 'product__name',
+        'seller__username', 'quantity', 'price', 'ordered', 'payment__payment_id',
+    ],
+    'payments': [
+        'id', 'payment_id', 'user__username', 'payment_method', 'amount_paid',
+        'status', 'created_at',
+    ],
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer"""
+    def write(self, value):
+        return value
+
+
+def build_export_queryset(dataset, start=None, end=None, seller=None, status=None):
+    """Return a values_list queryset for an export dataset with the given filters applied"""
+    if dataset == 'orders':
+        queryset = Order.objects.all()
+        date_field = 'created_at'
+        if seller is not None:
+            queryset = queryset.filter(id__in=OrderItem.objects.filter(seller=seller, ordered=True).values('order_id'))
+        if status:
+            queryset = queryset.annotate(effective_status=effective_status_expression()).filter(effective_status=status)
+    elif dataset == 'items':
+        queryset = OrderItem.objects.all()
+        date_field = 'order__created_at'
+        if seller is not None:
+            queryset = queryset.filter(seller=seller, ordered=True)
+        if status:
+            queryset = queryset.annotate(
+                effective_status=effective_status_expression('order__')
+            ).filter(effective_status=status)
+    elif dataset == 'payments':
+        queryset = Payment.objects.all()
+        date_field = 'created_at'
+        if seller is not None:
+            queryset = queryset.filter(id__in=OrderItem.objects.filter(seller=seller, ordered=True).values('payment_id'))
+        if status:
+            queryset = queryset.filter(status__iexact=status)
+    else:
+        raise ValueError(f"Unknown export dataset: {dataset}")
+
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__date__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{date_field}__date__lte': end})
+
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS[dataset])
+
+
+def iter_export_rows(dataset, queryset, export_format='csv'):
+    """Yield encoded export lines (header first for CSV) while streaming the queryset"""
+    fields = EXPORT_FIELDS[dataset]
+    rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    elif export_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), default=str) + '\n'
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,52 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Run a local stub of the eSewa status API for offline verification and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--status', default='COMPLETE', help='Status returned for every transaction')
+        parser.add_argument('--latency', type=int, default=0, help='Artificial response delay in milliseconds')
+
+    def handle(self, *args, **options):
+        status = options['status'].upper()
+        latency = options['latency'] / 1000
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateway
+
+            def do_GET(self):
+                params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                if latency:
+                    time.sleep(latency)
+                body = json.dumps({
+                    'product_code': params.get('product_code', ''),
+                    'transaction_uuid': params.get('transaction_uuid', ''),
+                    'total_amount': params.get('total_amount', ''),
+                    'status': status,
+                    'ref_id': f"STUB-{params.get('transaction_uuid', '')}" if status == 'COMPLETE' else None,
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StatusHandler)
+        self.stdout.write(self.style.SUCCESS(
+            f"eSewa stub listening on http://127.0.0.1:{options['port']}/ (status={status}) - "
+            f"use with reconcile_esewa --status-url"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from orders.exports import EXPORT_FIELDS, EXPORT_FORMATS, build_export_queryset, iter_export_rows
+
+class Command(BaseCommand):
+    help = 'Stream orders, order items or payments to CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_FIELDS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--start', help='Only include records on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Only include records on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--seller', help='Only include sales of this seller (username)')
+        parser.add_argument('--status', help='Only include this order/payment status')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'])
+        end = self._parse_date(options['end'])
+
+        seller = None
+        if options['seller']:
+            try:
+                seller = User.objects.get(username=options['seller'])
+            except User.DoesNotExist:
+                raise CommandError(f"Seller '{options['seller']}' does not exist")
+
+        queryset = build_export_queryset(
+            options['dataset'],
+            start=start,
+            end=end,
+            seller=seller,
+            status=options['status'].lower() if options['status'] else None,
+        )
+        lines = iter_export_rows(options['dataset'], queryset, options['export_format'])
+
+        if options['output']:
+            count = 0
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            self.stderr.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return parsed
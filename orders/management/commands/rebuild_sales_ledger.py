@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from orders.sales_ledger import backfill_sales_ledger, materialize_product_sales
+
+class Command(BaseCommand):
+    help = 'Record missing sales ledger events and rebuild product order_count/total_revenue from the ledger'
+
+    def handle(self, *args, **options):
+        touched = backfill_sales_ledger()
+        self.stdout.write(f'Recorded missing sales for {len(touched)} products')
+
+        updated = materialize_product_sales()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales aggregates for {updated} products'))
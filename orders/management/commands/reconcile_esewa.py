@@ -0,0 +1,79 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.models import Order
+from orders.payment_utils import ESewaVerificationClient
+from orders.views import complete_esewa_payment, send_order_confirmation_email
+
+# eSewa statuses after which the transaction can never complete
+FAILED_STATUSES = ['NOT_FOUND', 'CANCELED', 'FULL_REFUND']
+
+class Command(BaseCommand):
+    help = 'Verify stale initiated eSewa orders against the gateway status API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15,
+                            help='Only check orders initiated at least this many minutes ago')
+        parser.add_argument('--fail-after', type=int, default=24 * 60,
+                            help='Mark NOT_FOUND/CANCELED orders failed once they are this many minutes old')
+        parser.add_argument('--limit', type=int, default=500, help='Maximum orders to check per run')
+        parser.add_argument('--workers', type=int, default=10, help='Concurrent status checks')
+        parser.add_argument('--status-url', help='Override ESEWA_SETTINGS STATUS_URL (e.g. a local stub)')
+        parser.add_argument('--dry-run', action='store_true', help='Report statuses without changing orders')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        orders = list(
+            Order.objects.filter(
+                payment_method='eSewa',
+                payment_status='initiated',
+                created_at__lte=now - timedelta(minutes=options['older_than']),
+            ).exclude(esewa_transaction_uuid='')
+            .select_related('user').order_by('created_at')[:options['limit']]
+        )
+        if not orders:
+            self.stdout.write(self.style.SUCCESS('No stale eSewa orders to reconcile'))
+            return
+
+        client = ESewaVerificationClient(status_url=options['status_url'], pool_size=options['workers'])
+        started = time.monotonic()
+        try:
+            results = client.check_many(
+                [(order.esewa_transaction_uuid, int(round(float(order.grand_total or 0)))) for order in orders],
+                max_workers=options['workers'],
+            )
+        finally:
+            client.close()
+        elapsed = time.monotonic() - started
+
+        completed = failed = unresolved = 0
+        fail_cutoff = now - timedelta(minutes=options['fail_after'])
+
+        for order, result in zip(orders, results):
+            if result['success']:
+                if not options['dry_run']:
+                    order, completed_now = complete_esewa_payment(order, result['ref_id'], result['response'])
+                    if completed_now:
+                        send_order_confirmation_email(order)
+                    elif order.payment_status != 'completed':
+                        # The transaction code already paid for another order
+                        unresolved += 1
+                        self.stdout.write(f"Order {order.id} ({order.esewa_transaction_uuid}): transaction already used by another order")
+                        continue
+                completed += 1
+            elif result['status'] in FAILED_STATUSES and order.created_at <= fail_cutoff:
+                failed += 1
+                if not options['dry_run']:
+                    Order.objects.filter(pk=order.pk, payment_status='initiated').update(payment_status='failed')
+            else:
+                unresolved += 1
+            self.stdout.write(f"Order {order.id} ({order.esewa_transaction_uuid}): {result['status'] or result.get('error')}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Checked {len(orders)} orders in {elapsed:.2f}s ({len(orders) / elapsed:.1f}/s): '
+                f'{completed} completed, {failed} failed, {unresolved} unresolved'
+                f'{" (dry run)" if options["dry_run"] else ""}'
+            )
+        )
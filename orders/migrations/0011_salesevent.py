@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_delivery_date_order_delivery_notes'),
+        ('products', '0013_variationimage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('reversal', 'Reversal')], max_length=10)),
+                ('sign', models.SmallIntegerField(help_text='+1 for a sale, -1 for a reversal')),
+                ('quantity', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, help_text='Line total of the order item', max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_events', to='orders.order')),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_events', to='orders.orderitem')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_events', to='products.product')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='orders_sale_product_eca589_idx'), models.Index(fields=['seller', 'created_at'], name='orders_sale_seller__e8db6e_idx')],
+                'unique_together': {('order_item', 'kind')},
+            },
+        ),
+    ]
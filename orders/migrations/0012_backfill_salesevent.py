@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import F, IntegerField, DecimalField, Sum
+
+
+def backfill_sales_events(apps, schema_editor):
+    """Seed the sales ledger from already-sold orders and rebuild product counters from it"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SalesEvent = apps.get_model('orders', 'SalesEvent')
+    Product = apps.get_model('products', 'Product')
+
+    items = OrderItem.objects.filter(
+        order__payment_status__in=['completed', 'cod_pending'],
+        order__is_ordered=True,
+    ).values('id', 'order_id', 'product_id', 'seller_id', 'quantity', 'price', 'order__created_at')
+    SalesEvent.objects.bulk_create([
+        SalesEvent(
+            order_item_id=item['id'],
+            order_id=item['order_id'],
+            product_id=item['product_id'],
+            seller_id=item['seller_id'],
+            kind='sale',
+            sign=1,
+            quantity=item['quantity'],
+            revenue=Decimal(str(round(item['price'], 2))),
+            # Historical sales are dated by their orders, not by when this migration ran
+            created_at=item['order__created_at'],
+        )
+        for item in items.iterator()
+    ], batch_size=500)
+
+    totals = {
+        row['product_id']: row
+        for row in SalesEvent.objects.values('product_id').annotate(
+            units=Sum(F('quantity') * F('sign'), output_field=IntegerField()),
+            revenue=Sum(F('revenue') * F('sign'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+    }
+    products = []
+    for product in Product.objects.only('id').iterator():
+        row = totals.get(product.id, {})
+        product.order_count = max(row.get('units') or 0, 0)
+        product.total_revenue = max(row.get('revenue') or Decimal('0'), Decimal('0'))
+        products.append(product)
+    Product.objects.bulk_update(products, ['order_count', 'total_revenue'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_salesevent'),
+        ('products', '0013_variationimage'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_events, migrations.RunPython.noop),
+    ]
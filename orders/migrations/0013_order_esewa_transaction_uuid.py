@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:43
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_pending_esewa_uuids(apps, schema_editor):
+    """eSewa payments still awaiting a callback kept their transaction_uuid in payment_reference"""
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(
+        payment_method='eSewa', payment_status='initiated', payment_reference__isnull=False,
+    ).update(esewa_transaction_uuid=F('payment_reference'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_backfill_salesevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='esewa_transaction_uuid',
+            field=models.CharField(blank=True, default='', help_text='transaction_uuid sent to eSewa for this order - callbacks must match it', max_length=100),
+        ),
+        migrations.RunPython(copy_pending_esewa_uuids, migrations.RunPython.noop),
+    ]
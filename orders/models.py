@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
+from django.utils import timezone
 from products.models import Product, ProductVariation
 
 class Payment(models.Model):
@@ -13,6 +16,18 @@ class Payment(models.Model):
     def __str__(self):
         return self.payment_id
 
+def effective_status_expression(prefix=''):
+    """SQL equivalent of Order.get_effective_status() for annotate/filter/group by"""
+    return Case(
+        When(
+            Q(**{f'{prefix}order_status__isnull': False}) & ~Q(**{f'{prefix}order_status__in': ['', 'pending']}),
+            then=F(f'{prefix}order_status'),
+        ),
+        default=Lower(f'{prefix}status'),
+        output_field=models.CharField(),
+    )
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     address = models.CharField(max_length=255)
@@ -63,6 +78,7 @@ class Order(models.Model):
 
     payment_gateway_response = models.TextField(blank=True, null=True, help_text="Raw response from payment gateway")
     payment_reference = models.CharField(max_length=100, blank=True, null=True, help_text="Payment gateway reference ID or QR reference")
+    esewa_transaction_uuid = models.CharField(max_length=100, blank=True, default='', help_text="transaction_uuid sent to eSewa for this order - callbacks must match it")
     
     # QR PAYMENT SPECIFIC FIELDS
     qr_payment_confirmed_at = models.DateTimeField(null=True, blank=True, help_text="When QR payment was confirmed")
@@ -187,4 +203,33 @@ class OrderItem(models.Model):
         """Calculate unit price from total price and quantity"""
         if self.quantity > 0:
             return self.price / self.quantity
-        return 0
\ No newline at end of file
+        return 0
+
+class SalesEvent(models.Model):
+    """Append-only sales ledger - Product.order_count/total_revenue are materialized from it"""
+    KIND_CHOICES = [
+        ('sale', 'Sale'),
+        ('reversal', 'Reversal'),
+    ]
+
+    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='sales_events')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='sales_events')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_events')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    sign = models.SmallIntegerField(help_text="+1 for a sale, -1 for a reversal")
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, help_text="Line total of the order item")
+    # Not auto_now_add, so backfills can date events by their orders
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Each order item is sold at most once and reversed at most once
+        unique_together = ('order_item', 'kind')
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['seller', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.product_id} x {self.sign * self.quantity}"
@@ -1,11 +1,87 @@
 import requests
 import json
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class ESewaVerificationClient:
+    """Server-side eSewa transaction status checks over a pooled keep-alive session"""
+
+    def __init__(self, status_url=None, timeout=None, retries=None, pool_size=None):
+        esewa = settings.ESEWA_SETTINGS
+        self.status_url = status_url or esewa['STATUS_URL']
+        self.timeout = timeout or esewa.get('VERIFY_TIMEOUT', (3.05, 10))
+        retries = esewa.get('VERIFY_RETRIES', 3) if retries is None else retries
+        pool_size = pool_size or esewa.get('VERIFY_POOL_SIZE', 10)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = pool_size
+
+    def check_status(self, transaction_uuid, total_amount):
+        """Ask eSewa for the status of one transaction"""
+        params = {
+            'product_code': settings.ESEWA_PRODUCT_CODE,
+            'total_amount': total_amount,
+            'transaction_uuid': transaction_uuid,
+        }
+        try:
+            response = self.session.get(self.status_url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"eSewa status check failed for {transaction_uuid}: {e}")
+            return {'success': False, 'status': '', 'retryable': True, 'transaction_uuid': transaction_uuid, 'error': str(e)}
+
+        status = str(data.get('status', '')).upper()
+        return {
+            'success': status == 'COMPLETE',
+            'status': status,
+            'transaction_uuid': transaction_uuid,
+            'ref_id': data.get('ref_id') or '',
+            'response': data,
+        }
+
+    def check_many(self, transactions, max_workers=None):
+        """Check (transaction_uuid, total_amount) pairs concurrently, results in input order"""
+        max_workers = max_workers or self.pool_size
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda txn: self.check_status(*txn), transactions))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_esewa_client():
+    """Process-wide client so every request reuses the same connection pool"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ESewaVerificationClient()
+    return _client
+
+
 class ESewaPayment:
     @staticmethod
     def initiate_payment(order):
@@ -34,24 +110,42 @@ class ESewaPayment:
             return None
     
     @staticmethod
-    def verify_payment(request):
+    def decode_response(request):
+        """Decode the base64 JSON payload eSewa appends to the return URL"""
+        encoded = request.GET.get("data") or request.POST.get("data") \
+               or request.GET.get("response") or request.POST.get("response")
+        if not encoded:
+            return {}
         try:
-            total_amount = request.GET.get('amt')
-            transaction_uuid = request.GET.get('refId') 
-            product_id = request.GET.get('oid')
-            
-            if total_amount and transaction_uuid and product_id:
-                return {
-                    'success': True,
-                    'transaction_id': transaction_uuid,
-                    'amount': total_amount,
-                    'product_id': product_id
-                }
-            else:
-                return {'success': False, 'error': 'Missing required parameters'}
-            
+            return json.loads(base64.b64decode(encoded).decode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Error decoding eSewa response: {e}")
+            return {}
+
+    @staticmethod
+    def verify_payment(request, order):
+        """Verify the returned transaction with eSewa's status API instead of trusting the payload"""
+        try:
+            payload = ESewaPayment.decode_response(request)
+            transaction_uuid = payload.get('transaction_uuid')
+
+            if str(payload.get('status', '')).upper() != 'COMPLETE' or not transaction_uuid:
+                return {'success': False, 'payload': payload, 'error': 'Payment not completed'}
+
+            # Only the transaction esewa_start issued for this order can pay for it
+            if not order.esewa_transaction_uuid or transaction_uuid != order.esewa_transaction_uuid:
+                logger.warning(f"eSewa transaction {transaction_uuid} does not belong to order {order.id}")
+                return {'success': False, 'payload': payload, 'error': 'Transaction does not belong to this order'}
+
+            # Amount comes from our order, so a tampered payload cannot change it
+            total_amount = int(round(float(order.grand_total or 0)))
+            result = get_esewa_client().check_status(transaction_uuid, total_amount)
+            result['payload'] = payload
+            result['transaction_id'] = payload.get('transaction_code') or result.get('ref_id', '')
+            return result
+
         except Exception as e:
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'payload': {}, 'error': str(e)}
 
 # QR Payment class for future enhancements
 class QRPayment:
@@ -0,0 +1,144 @@
+# orders/qr_verification.py
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+from products.clickstream import capture_event
+from products.models import Product, ProductVariation
+from users.dashboard import invalidate_order_dashboards
+from users.notification_utils import create_notifications
+from .models import Order, OrderItem
+from .sales_ledger import record_sales, record_reversals
+from .views import send_order_confirmation_email, send_order_rejection_email
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _pending_qr_order_ids(order_ids, seller=None):
+    """Lock and return the ids of orders still awaiting QR verification (optionally only this seller's)"""
+    orders = Order.objects.select_for_update().filter(
+        id__in=order_ids,
+        payment_method='QR Payment',
+        payment_status='pending_verification'
+    )
+    if seller is not None:
+        orders = orders.filter(id__in=OrderItem.objects.filter(seller=seller).values('order_id'))
+    return list(orders.values_list('id', flat=True))
+
+
+def _restock(order_ids):
+    """Put the orders' quantities back on products and variations - one UPDATE each"""
+    product_totals = OrderItem.objects.filter(order_id__in=order_ids).values('product_id').annotate(
+        units=Sum('quantity')
+    ).order_by()
+    product_totals = {row['product_id']: row['units'] for row in product_totals}
+    if product_totals:
+        Product.objects.filter(pk__in=product_totals).update(stock=Case(
+            *[When(pk=pk, then=F('stock') + quantity) for pk, quantity in product_totals.items()],
+            default=F('stock'),
+        ))
+
+    Through = OrderItem.variations.through
+    variation_totals = Through.objects.filter(orderitem__order_id__in=order_ids).values('productvariation_id').annotate(
+        units=Sum('orderitem__quantity')
+    ).order_by()
+    variation_totals = {row['productvariation_id']: row['units'] for row in variation_totals}
+    if variation_totals:
+        ProductVariation.objects.filter(pk__in=variation_totals).update(stock_quantity=Case(
+            *[When(pk=pk, then=F('stock_quantity') + quantity) for pk, quantity in variation_totals.items()],
+            default=F('stock_quantity'),
+        ))
+
+
+def send_qr_payment_side_effects(orders, verified):
+    """Email every customer over one SMTP connection and insert all notifications at once"""
+    send_email = send_order_confirmation_email if verified else send_order_rejection_email
+    emails_sent = 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+        for order in orders:
+            if send_email(order, connection=connection):
+                emails_sent += 1
+    except Exception as e:
+        logger.error(f"Error sending QR payment emails: {e}")
+    finally:
+        connection.close()
+
+    if verified:
+        notification = {
+            'title': 'Payment Verified!',
+            'message': 'Your payment for Order #{} has been verified and confirmed.',
+            'icon': 'fa-check-circle',
+            'color': 'success',
+        }
+    else:
+        notification = {
+            'title': 'Payment Rejected',
+            'message': 'Your payment for Order #{} could not be verified and has been rejected.',
+            'icon': 'fa-times-circle',
+            'color': 'danger',
+        }
+
+    create_notifications([
+        {
+            'user': order.user,
+            'notification_type': 'order',
+            'title': notification['title'],
+            'message': notification['message'].format(order.order_number),
+            'icon': notification['icon'],
+            'color': notification['color'],
+            'url': '/orders/my-orders/',
+        }
+        for order in orders
+    ])
+    return emails_sent
+
+
+def bulk_verify_qr_payments(order_ids, verified_by, seller=None):
+    """Verify many QR payments in one transaction, then fan out emails/notifications - returns the orders"""
+    with transaction.atomic():
+        ids = _pending_qr_order_ids(order_ids, seller)
+        if not ids:
+            return []
+
+        Order.objects.filter(id__in=ids).update(
+            payment_status='completed',
+            status='Confirmed',
+            order_status='confirmed',
+            qr_payment_verified_by=verified_by,
+            qr_payment_verified_at=timezone.now(),
+        )
+        record_sales(ids)
+        invalidate_order_dashboards(ids)
+
+    orders = list(Order.objects.filter(id__in=ids).select_related('user'))
+    for order in orders:
+        capture_event('paid', user_id=order.user_id, order_id=order.id, amount=order.grand_total)
+    send_qr_payment_side_effects(orders, verified=True)
+    logger.info(f"Verified {len(orders)} QR payments by {verified_by.username}")
+    return orders
+
+
+def bulk_reject_qr_payments(order_ids, seller=None):
+    """Reject many QR payments in one transaction (analytics and stock reverted), then fan out - returns the orders"""
+    with transaction.atomic():
+        ids = _pending_qr_order_ids(order_ids, seller)
+        if not ids:
+            return []
+
+        record_reversals(ids)
+        _restock(ids)
+        Order.objects.filter(id__in=ids).update(
+            payment_status='rejected',
+            status='Payment Rejected',
+            order_status='cancelled',
+        )
+        invalidate_order_dashboards(ids)
+
+    orders = list(Order.objects.filter(id__in=ids).select_related('user'))
+    send_qr_payment_side_effects(orders, verified=False)
+    logger.info(f"Rejected {len(orders)} QR payments")
+    return orders
@@ -0,0 +1,146 @@
+# orders/sales_ledger.py
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+from products.models import Product
+from .models import Order, OrderItem, SalesEvent
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Orders in these payment states count as sold
+SOLD_PAYMENT_STATUSES = ['completed', 'cod_pending']
+
+MATERIALIZE_BATCH_SIZE = 500
+
+
+def _apply_deltas(events):
+    """Add the events' signed units and revenue to their products' counters - one UPDATE, clamped at zero"""
+    units, revenue = defaultdict(int), defaultdict(Decimal)
+    for event in events:
+        units[event.product_id] += event.sign * event.quantity
+        revenue[event.product_id] += event.sign * event.revenue
+
+    Product.objects.filter(pk__in=units).update(
+        order_count=Greatest(F('order_count') + Case(
+            *[When(pk=product_id, then=Value(delta)) for product_id, delta in units.items()],
+            default=Value(0), output_field=models.IntegerField(),
+        ), Value(0)),
+        total_revenue=Greatest(F('total_revenue') + Case(
+            *[When(pk=product_id, then=Value(delta)) for product_id, delta in revenue.items()],
+            default=Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ), Value(Decimal('0'))),
+    )
+
+
+def _insert_new(events):
+    """Insert the events, skipping any whose (order_item, kind) is already recorded - returns the inserted ones"""
+    try:
+        with transaction.atomic():
+            SalesEvent.objects.bulk_create(events, batch_size=MATERIALIZE_BATCH_SIZE)
+        return events
+    except IntegrityError:
+        # Some were recorded concurrently - insert one at a time to learn which are new
+        inserted = []
+        for event in events:
+            event.pk = None
+            try:
+                with transaction.atomic():
+                    event.save(force_insert=True)
+                inserted.append(event)
+            except IntegrityError:
+                pass
+        return inserted
+
+
+def _record(order_ids, kind):
+    """Append one event of this kind per order item that does not have one yet - returns touched product ids"""
+    items = OrderItem.objects.filter(order_id__in=order_ids).exclude(sales_events__kind=kind)
+    if kind == 'reversal':
+        # Only sales that were recorded can be reversed
+        items = items.filter(sales_events__kind='sale')
+
+    sign = 1 if kind == 'sale' else -1
+    events = [
+        SalesEvent(
+            order_item_id=item['id'],
+            order_id=item['order_id'],
+            product_id=item['product_id'],
+            seller_id=item['seller_id'],
+            kind=kind,
+            sign=sign,
+            quantity=item['quantity'],
+            revenue=Decimal(str(round(item['price'], 2))),
+        )
+        for item in items.values('id', 'order_id', 'product_id', 'seller_id', 'quantity', 'price')
+    ]
+    if not events:
+        return set()
+
+    with transaction.atomic():
+        # Counters move by the events inserted here only - full rebuilds are left to the management commands
+        events = _insert_new(events)
+        if events:
+            _apply_deltas(events)
+
+    product_ids = {event.product_id for event in events}
+    logger.info(f"Recorded {len(events)} {kind} events for {len(product_ids)} products")
+    return product_ids
+
+
+def record_sales(order_ids):
+    """Record the orders' items as sold (idempotent) and add them to their products' aggregates"""
+    return _record(order_ids, 'sale')
+
+
+def record_reversals(order_ids):
+    """Reverse previously recorded sales of the orders (idempotent) and subtract them from their products' aggregates"""
+    return _record(order_ids, 'reversal')
+
+
+def sales_totals(product_ids=None):
+    """Net units and revenue per product from the ledger - one GROUP BY"""
+    events = SalesEvent.objects.all()
+    if product_ids is not None:
+        events = events.filter(product_id__in=product_ids)
+    return {
+        row['product_id']: (row['units'] or 0, row['revenue'] or Decimal('0'))
+        for row in events.values('product_id').annotate(
+            units=Sum(F('quantity') * F('sign'), output_field=models.IntegerField()),
+            revenue=Sum(F('revenue') * F('sign'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+    }
+
+
+def materialize_product_sales(product_ids=None, batch_size=MATERIALIZE_BATCH_SIZE, progress=None):
+    """Rebuild order_count/total_revenue from the ledger - for the given products, or all when None.
+
+    product_ids may be a list or a queryset of ids. progress(done, total) is called after each batch.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    totals = sales_totals(products.values('pk'))
+    # Ids are fetched up front so no read cursor stays open across the writes
+    ids = list(products.order_by('pk').values_list('pk', flat=True))
+
+    updated = 0
+    for start in range(0, len(ids), batch_size):
+        batch = []
+        for product_id in ids[start:start + batch_size]:
+            units, revenue = totals.get(product_id, (0, Decimal('0')))
+            batch.append(Product(pk=product_id, order_count=max(units, 0), total_revenue=max(revenue, Decimal('0'))))
+        updated += Product.objects.bulk_update(batch, ['order_count', 'total_revenue'])
+        if progress:
+            progress(updated, len(ids))
+    return updated
+
+
+def backfill_sales_ledger(since=None):
+    """Record sale events for every sold order (created on/after since) missing them - safe to run repeatedly"""
+    sold_orders = Order.objects.filter(payment_status__in=SOLD_PAYMENT_STATUSES, is_ordered=True)
+    if since:
+        sold_orders = sold_orders.filter(created_at__date__gte=since)
+    return record_sales(sold_orders.values('id'))
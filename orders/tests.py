@@ -1,3 +1,164 @@
+import base64
+import json
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from products.models import Category, Product
+from .models import Order, OrderItem, SalesEvent
+from .sales_ledger import _insert_new, materialize_product_sales, record_reversals, record_sales
+from .views import complete_esewa_payment
 
-# Create your tests here.
+
+def make_product(seller, name='Phone', price=100):
+    category, _ = Category.objects.get_or_create(category_name='Electronics')
+    return Product.objects.create(
+        name=name, price=price, description='d', stock=50, category=category, seller=seller,
+        approval_status='approved', status=True, admin_approved=True,
+    )
+
+
+def make_order(buyer, items, **fields):
+    """An order with one item per (product, quantity)"""
+    total = sum(product.price * quantity for product, quantity in items)
+    order = Order.objects.create(
+        user=buyer, address='Street 1', city='Kathmandu', country='Nepal', zip='44600',
+        total=total, tax=0, grand_total=total, **fields,
+    )
+    for product, quantity in items:
+        OrderItem.objects.create(
+            order=order, product=product, seller=product.seller, quantity=quantity,
+            price=product.price * quantity, ordered=True,
+        )
+    return order
+
+
+class SalesLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        cls.phone = make_product(cls.seller, 'Phone', 100)
+        cls.case = make_product(cls.seller, 'Case', 15)
+
+    def counters(self, product):
+        product.refresh_from_db()
+        return product.order_count, product.total_revenue
+
+    def test_record_sales_adds_each_item_once(self):
+        order = make_order(self.buyer, [(self.phone, 2), (self.case, 1)])
+
+        self.assertEqual(record_sales([order.id]), {self.phone.id, self.case.id})
+        self.assertEqual(record_sales([order.id]), set())
+
+        self.assertEqual(SalesEvent.objects.filter(order=order, kind='sale').count(), 2)
+        self.assertEqual(self.counters(self.phone), (2, Decimal('200.00')))
+        self.assertEqual(self.counters(self.case), (1, Decimal('15.00')))
+
+    def test_reversal_subtracts_recorded_sales_once(self):
+        first = make_order(self.buyer, [(self.phone, 1)])
+        second = make_order(self.buyer, [(self.phone, 3)])
+        record_sales([first.id, second.id])
+
+        record_reversals([first.id])
+        record_reversals([first.id])
+
+        self.assertEqual(self.counters(self.phone), (3, Decimal('300.00')))
+
+    def test_unrecorded_sales_are_not_reversed(self):
+        order = make_order(self.buyer, [(self.phone, 1)])
+
+        self.assertEqual(record_reversals([order.id]), set())
+        self.assertFalse(SalesEvent.objects.exists())
+        self.assertEqual(self.counters(self.phone), (0, Decimal('0')))
+
+    def test_deltas_match_a_rebuild_from_the_ledger(self):
+        orders = [make_order(self.buyer, [(self.phone, n), (self.case, n + 1)]) for n in range(1, 4)]
+        record_sales([order.id for order in orders])
+        record_reversals([orders[1].id])
+        incremental = [self.counters(self.phone), self.counters(self.case)]
+
+        materialize_product_sales()
+
+        self.assertEqual([self.counters(self.phone), self.counters(self.case)], incremental)
+
+    def test_insert_new_returns_only_events_not_yet_recorded(self):
+        order = make_order(self.buyer, [(self.phone, 1), (self.case, 1)])
+        phone_item, case_item = order.items.order_by('id')
+
+        def event(item):
+            return SalesEvent(order_item=item, order=order, product=item.product, seller=self.seller,
+                              kind='sale', sign=1, quantity=item.quantity, revenue=item.price)
+
+        # Recorded concurrently by another request
+        event(phone_item).save()
+
+        inserted = _insert_new([event(phone_item), event(case_item)])
+
+        self.assertEqual([e.order_item_id for e in inserted], [case_item.id])
+        self.assertEqual(SalesEvent.objects.count(), 2)
+
+
+@mock.patch('orders.payment_utils.ESewaVerificationClient.check_status',
+            return_value={'success': True, 'status': 'COMPLETE', 'ref_id': 'REF-1'})
+class ESewaCallbackTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        cls.phone = make_product(cls.seller, 'Phone', 100)
+
+    def setUp(self):
+        self.client.force_login(self.buyer)
+
+    def start_order(self, uuid, quantity=2):
+        """An order esewa_start has sent to eSewa with this transaction_uuid"""
+        return make_order(self.buyer, [(self.phone, quantity)],
+                          payment_method='eSewa', payment_status='initiated', esewa_transaction_uuid=uuid)
+
+    def callback(self, order, uuid, code):
+        data = base64.b64encode(json.dumps({
+            'status': 'COMPLETE', 'transaction_uuid': uuid, 'transaction_code': code,
+        }).encode()).decode()
+        return self.client.get(reverse('esewa_return', args=[order.id]), {'data': data})
+
+    def test_replayed_callback_completes_the_order_once(self, check_status):
+        order = self.start_order('uuid-1')
+
+        first = self.callback(order, 'uuid-1', 'TXN-1')
+        replay = self.callback(order, 'uuid-1', 'TXN-1')
+
+        self.assertRedirects(first, reverse('order_complete', args=[order.id]), fetch_redirect_response=False)
+        self.assertRedirects(replay, reverse('order_complete', args=[order.id]), fetch_redirect_response=False)
+        # The paid order is short-circuited before any verification
+        self.assertEqual(check_status.call_count, 1)
+
+        order.refresh_from_db()
+        self.phone.refresh_from_db()
+        self.assertEqual(order.payment_status, 'completed')
+        self.assertEqual(order.payment_reference, 'TXN-1')
+        self.assertEqual(self.phone.stock, 48)
+        self.assertEqual(SalesEvent.objects.filter(order=order).count(), 1)
+
+    def test_callback_for_another_orders_transaction_is_rejected(self, check_status):
+        self.start_order('uuid-1')
+        other = self.start_order('uuid-2')
+
+        response = self.callback(other, 'uuid-1', 'TXN-1')
+
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        check_status.assert_not_called()
+        other.refresh_from_db()
+        self.assertEqual(other.payment_status, 'initiated')
+
+    def test_transaction_code_cannot_pay_for_two_orders(self, check_status):
+        first = self.start_order('uuid-1')
+        second = self.start_order('uuid-2')
+
+        _, first_completed = complete_esewa_payment(first, 'TXN-1', {})
+        second, second_completed = complete_esewa_payment(second, 'TXN-1', {})
+
+        self.assertTrue(first_completed)
+        self.assertFalse(second_completed)
+        self.assertEqual(second.payment_status, 'initiated')
@@ -11,4 +11,5 @@ urlpatterns = [
     path('esewa-start/<int:order_id>/', views.esewa_start, name='esewa_start'),
     path('esewa-return/<int:order_id>/', views.esewa_return, name='esewa_return'),
     path('confirm-qr-payment/<int:order_id>/', views.confirm_qr_payment, name='confirm_qr_payment'),
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
 ]
\ No newline at end of file
@@ -1,13 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.contrib.auth.models import User
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from .models import Order, OrderItem, Payment
 from cart.models import Cart, CartItem
 from django.middleware.csrf import get_token
 from .payment_utils import ESewaPayment
+from .sales_ledger import record_sales
+from .exports import EXPORT_FIELDS, EXPORT_FORMATS, build_export_queryset, iter_export_rows
 import uuid, json, base64, hmac, hashlib, time, datetime
 from django.db.models import F
 from django.core.mail import send_mail, EmailMessage
@@ -16,7 +20,11 @@ from django.urls import reverse
 from django.conf import settings
 import logging
 from django.utils import timezone
-from django.db.models import Q, F
+from django.db.models import Q, F, Case, When, Sum
+from django.db import transaction
+from products.models import Product
+from products.clickstream import capture_event
+from users.dashboard import invalidate_order_dashboards
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +46,7 @@ def _make_signature(total_amount: int, transaction_uuid: str) -> str:
     ).digest()
     return base64.b64encode(mac).decode("utf-8")
 
-def send_order_confirmation_email(order):
+def send_order_confirmation_email(order, connection=None):
     """Send order confirmation email after successful payment"""
     print("🔄 EMAIL FUNCTION CALLED!")
     print(f"🔄 Order ID: {order.id}")
@@ -189,6 +197,7 @@ Islington Marketplace Team
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[order.user.email],
             fail_silently=False,
+            connection=connection,
         )
         
         print(f" Order confirmation email sent to {order.user.email}")
@@ -200,7 +209,7 @@ Islington Marketplace Team
         traceback.print_exc()
         return False
 
-def send_order_rejection_email(order):
+def send_order_rejection_email(order, connection=None):
     """Send email when QR payment is rejected"""
     print("🔄 REJECTION EMAIL FUNCTION CALLED!")
     print(f"🔄 Order ID: {order.id}")
@@ -260,6 +269,7 @@ Islington Marketplace Team
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[order.user.email],
             fail_silently=False,
+            connection=connection,
         )
         
         print(f" Order rejection email sent to {order.user.email}")
@@ -271,37 +281,6 @@ Islington Marketplace Team
         traceback.print_exc()
         return False
 
-def revert_stock_after_rejection(order):
-    """Revert stock back when order is rejected"""
-    print(f"🔄 REVERTING STOCK for Order #{order.id}")
-    
-    try:
-        order_items = order.items.all()
-        
-        for item in order_items:
-            product = item.product
-            quantity = item.quantity
-            
-            # Add stock back to main product
-            product.stock += quantity
-            product.save()
-            print(f" Reverted {quantity} stock to {product.name} (New stock: {product.stock})")
-            
-            # Add stock back to variations if any
-            for variation in item.variations.all():
-                variation.stock_quantity += quantity
-                variation.save()
-                print(f" Reverted {quantity} stock to variation {variation.variation_option.value}")
-        
-        print(f" Stock reverted successfully for Order #{order.id}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Stock reversion failed for Order #{order.id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-    
 def send_order_shipped_email(order):
     """Send email when order is shipped"""
     print(" SHIPPING EMAIL FUNCTION CALLED!")
@@ -572,6 +551,8 @@ def checkout(request):
         tax = total * 0.13
         grand_total = total + tax
         
+        capture_event('checkout', request, amount=grand_total)
+
         context = {
             'items': items,
             'total': total,
@@ -662,6 +643,7 @@ def place_order(request):
             
             # Store order ID in session
             request.session['pending_order_id'] = order.id
+            capture_event('order', request, order_id=order.id, amount=grand_total)
             
             if payment_method == 'Cash on Delivery':
                 print("🚀 PROCESSING COD...")
@@ -673,6 +655,7 @@ def place_order(request):
                 order.status = 'Confirmed'
                 order.is_ordered = True
                 order.save()
+                record_sales([order.id])
                 
                 print(f"🔄 COD ORDER COMPLETED - ID: {order.id}")
                 
@@ -765,6 +748,69 @@ def place_order(request):
     print("🚀 NOT POST REQUEST - REDIRECTING")
     return redirect('checkout')
 
+def complete_esewa_payment(order, txn_code, payload):
+    """Mark an eSewa order paid exactly once - returns (order, completed_now).
+
+    Keyed on the gateway transaction code: a replayed callback finds the order
+    already claimed and returns early without touching items, stock or cart, and
+    a code that already paid for another order is refused.
+    """
+    payment_id = txn_code or f"esewa-{order.id}"
+
+    with transaction.atomic():
+        if Order.objects.filter(payment__payment_id=payment_id).exclude(pk=order.pk).exists():
+            logger.warning(f"eSewa transaction {payment_id} already paid for another order, refused for order {order.id}")
+            order.refresh_from_db()
+            return order, False
+
+        payment, created = Payment.objects.get_or_create(
+            user=order.user,
+            payment_id=payment_id,
+            defaults={
+                "payment_method": "eSewa",
+                "amount_paid": str(_order_amount(order)),
+                "status": "COMPLETED",
+            },
+        )
+        logger.info(f"eSewa payment {payment.payment_id} for order {order.id}, created: {created}")
+
+        # Conditional UPDATE claims the order - only one callback can win it
+        claimed = Order.objects.filter(pk=order.pk).exclude(payment_status='completed').update(
+            payment=payment,
+            is_ordered=True,
+            payment_status='completed',
+            status="Confirmed",
+            payment_reference=txn_code,
+            payment_gateway_response=json.dumps(payload),
+        )
+        if not claimed:
+            order.refresh_from_db()
+            return order, False
+
+        # Mark every order item paid in one statement
+        order.items.filter(ordered=False).update(payment=payment, ordered=True)
+        record_sales([order.pk])
+
+        # Decrease stock for all products in one batched statement
+        quantities = {
+            row['product_id']: row['quantity']
+            for row in order.items.values('product_id').annotate(quantity=Sum('quantity')).order_by()
+        }
+        if quantities:
+            Product.objects.filter(pk__in=quantities).update(stock=Case(
+                *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                default=F('stock'),
+            ))
+
+        # Clear cart
+        CartItem.objects.filter(cart__user=order.user).delete()
+        invalidate_order_dashboards([order.pk])
+
+    order.refresh_from_db()
+    capture_event('paid', user_id=order.user_id, order_id=order.id, amount=_order_amount(order))
+    logger.info(f"Order {order.id} completed by eSewa")
+    return order, True
+
 #  ESEWA FUNCTIONS
 @login_required
 def esewa_start(request, order_id):
@@ -779,6 +825,13 @@ def esewa_start(request, order_id):
 
     txn_uuid = f"{order.order_number or order.id}-{uuid.uuid4().hex[:8]}"
 
+    # Remember the transaction so callbacks can be matched to it and reconcile_esewa
+    # can verify it if the user never returns
+    if order.payment_status != 'completed':
+        order.esewa_transaction_uuid = txn_uuid
+        order.payment_status = 'initiated'
+        order.save(update_fields=['esewa_transaction_uuid', 'payment_status'])
+
     form = {
         "amount": int(amount),
         "tax_amount": int(tax),
@@ -807,81 +860,38 @@ def esewa_return(request, order_id):
     """FIXED eSewa return function - NO ANALYTICS HERE (prevents double counting)"""
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    encoded = request.GET.get("data") or request.POST.get("data") \
-           or request.GET.get("response") or request.POST.get("response")
-
-    payload, status, txn_code = {}, "", ""
-    if encoded:
-        try:
-            payload = json.loads(base64.b64decode(encoded).decode("utf-8"))
-            status = str(payload.get("status", "")).upper()
-            txn_code = payload.get("transaction_code", "")
-            print(f" eSewa Response Decoded: {payload}")
-        except Exception as e:
-            print(f"❌ Error decoding eSewa response: {e}")
-            pass
-
-    print(f" eSewa Response: Status={status}, TxnCode={txn_code}")
-
-    if status == "COMPLETE":
-        # Create Payment
-        amount_paid = _order_amount(order)
-        payment, created = Payment.objects.get_or_create(
-            user=order.user,
-            payment_id=txn_code or f"esewa-{order.id}",
-            defaults={
-                "payment_method": "eSewa",
-                "amount_paid": str(amount_paid),
-                "status": "COMPLETED",
-            },
-        )
-        
-        print(f" Payment created: {payment.payment_id}, Created: {created}")
-
-        # Get cart items correctly using cart relationship
-        if not order.items.filter(ordered=True).exists():
-            try:
-                cart = Cart.objects.get(user=order.user)
-                cart_items = CartItem.objects.filter(cart=cart).select_related("product")
-                
-                print(f" Found {cart_items.count()} cart items to process")
-                
-                for item in cart_items:
-                    # Find corresponding order item
-                    order_item = order.items.filter(product=item.product).first()
-                    if order_item:
-                        order_item.payment = payment
-                        order_item.ordered = True
-                        order_item.save()
-                        print(f" Updated order item: {order_item.product.name}")
-                    
-                    # Decrease stock using F() to avoid race conditions
-                    Product = item.product.__class__
-                    Product.objects.filter(pk=item.product_id).update(stock=F("stock") - item.quantity)
-                    print(f" Decreased stock for: {item.product.name}")
-                
-                # Clear cart
-                cart_items.delete()
-                print(" Cart cleared")
-                
-            except Cart.DoesNotExist:
-                print("❌ No cart found for user")
-                pass
+    # A repeated callback for a paid order needs no verification
+    if order.payment_status == 'completed':
+        logger.info(f"Duplicate eSewa callback ignored for order {order.id}")
+        request.session.pop('pending_order_id', None)
+        messages.success(request, 'eSewa payment successful! Order confirmed.')
+        return redirect('order_complete', order_id=order.id)
 
-        # Send email
-        email_sent = send_order_confirmation_email(order)
-        print(f" Email sent: {email_sent}")
-        
-        # Mark order completed
-        order.payment = payment
-        order.is_ordered = True
-        order.payment_status = 'completed'
-        order.status = "Confirmed"
-        order.payment_reference = txn_code
-        order.payment_gateway_response = json.dumps(payload)
-        order.save()
-        
-        print(f" Order completed: {order.id}")
+    verification = ESewaPayment.verify_payment(request, order)
+    payload = verification.get('payload', {})
+    status = verification.get('status', '')
+    txn_code = verification.get('transaction_id', '')
+    logger.info(f"eSewa return for order {order.id}: status={status}, txn_code={txn_code}, payload={payload}")
+
+    if verification.get('retryable'):
+        # Gateway unreachable - leave the order initiated for reconcile_esewa to pick up
+        logger.warning(f"eSewa verification unavailable for order {order.id}: {verification.get('error')}")
+        messages.warning(request, "We could not confirm your eSewa payment yet. Your order will be updated once eSewa confirms it.")
+        return redirect('my_orders')
+
+    if verification['success']:
+        order, completed_now = complete_esewa_payment(order, txn_code, payload)
+
+        if completed_now:
+            # Send email only for the callback that actually completed the order
+            email_sent = send_order_confirmation_email(order)
+            logger.info(f"Confirmation email for order {order.id} sent: {email_sent}")
+        elif order.payment_status != 'completed':
+            # The transaction paid for a different order
+            messages.error(request, "This eSewa transaction does not belong to this order.")
+            return redirect('checkout')
+        else:
+            logger.info(f"Duplicate eSewa callback ignored for order {order.id}")
         
         # Clear session
         if 'pending_order_id' in request.session:
@@ -891,7 +901,7 @@ def esewa_return(request, order_id):
         return redirect('order_complete', order_id=order.id)
     
     # Failure
-    print(f"❌ eSewa payment failed: Status={status}")
+    logger.warning(f"eSewa payment failed for order {order.id}: status={status}, error={verification.get('error')}")
     messages.error(request, "eSewa payment was not completed.")
     return redirect('checkout')
 
@@ -1077,9 +1087,8 @@ def order_complete(request, order_id):
 # When an order is completed, update product analytics
 def complete_order(order):
     """Update product analytics when order is completed"""
-    for item in order.items.all():
-        # Refresh analytics for each product
-        item.product.get_analytics_data()
+    # Idempotent - items already in the sales ledger are skipped
+    record_sales([order.id])
 
 
 # Fallback functions for old URLs
@@ -1089,4 +1098,58 @@ def esewa_success(request):
 
 def esewa_failure(request):
     messages.error(request, 'Payment was cancelled or failed. Please try again.')
-    return redirect('checkout')
\ No newline at end of file
+    return redirect('checkout')
+
+
+@login_required
+def export_data(request, dataset):
+    """Stream orders, order items or payments as CSV/JSONL - admins see everything, sellers their own order items"""
+    if dataset not in EXPORT_FIELDS:
+        messages.error(request, 'Unknown export type.')
+        return redirect('dashboard')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+
+    if request.user.is_staff:
+        seller = None
+        seller_username = request.GET.get('seller', '').strip()
+        if seller_username:
+            seller = get_object_or_404(User, username=seller_username)
+    elif request.user.profile.seller_status == 'approved':
+        # Orders and payments carry whole multi-seller totals and buyer details - sellers get their items only
+        if dataset != 'items':
+            messages.error(request, 'Sellers can only export their order items.')
+            return redirect('seller_received_orders')
+        seller = request.user
+    else:
+        messages.error(request, 'You need to be an approved seller to export order data.')
+        return redirect('dashboard')
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name, '').strip()
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            # Well-formed but impossible dates such as 2024-02-30
+            dates[name] = None
+        if value and dates[name] is None:
+            return HttpResponse(f"Invalid {name} date '{value}', expected YYYY-MM-DD.", status=400, content_type='text/plain')
+
+    queryset = build_export_queryset(
+        dataset,
+        start=dates['start'],
+        end=dates['end'],
+        seller=seller,
+        status=request.GET.get('status', '').strip().lower() or None,
+    )
+
+    response = StreamingHttpResponse(
+        iter_export_rows(dataset, queryset, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    filename = f"{dataset}-{timezone.now().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
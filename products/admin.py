@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Product, Category, Review, VariationType, VariationOption, CategoryVariation, ProductVariation  # Added variation imports
+from .ratings import set_reviews_status
 from django.utils.html import format_html
 
 
@@ -96,12 +97,12 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'reject_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(status=True)
+        updated = set_reviews_status(queryset, True)
         self.message_user(request, f'{updated} reviews have been approved.')
     approve_reviews.short_description = "✅ Approve selected reviews"
     
     def reject_reviews(self, request, queryset):
-        updated = queryset.update(status=False)
+        updated = set_reviews_status(queryset, False)
         self.message_user(request, f'{updated} reviews have been hidden.')
     reject_reviews.short_description = "❌ Hide selected reviews"
 
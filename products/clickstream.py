@@ -0,0 +1,158 @@
+# products/clickstream.py
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Funnel events, in funnel order
+EVENTS = ['view', 'cart', 'checkout', 'order', 'paid']
+
+# Events are appended to local JSONL files by a background thread, so the request
+# path only pays for a queue put - never a DB write or a blocking file write
+CLICKSTREAM_ENABLED = getattr(settings, 'CLICKSTREAM_ENABLED', True)
+CLICKSTREAM_DIR = getattr(settings, 'CLICKSTREAM_DIR', os.path.join(settings.BASE_DIR, 'clickstream'))
+CLICKSTREAM_MAX_BYTES = getattr(settings, 'CLICKSTREAM_MAX_BYTES', 64 * 1024 * 1024)
+QUEUE_SIZE = 10000
+WRITE_BATCH_SIZE = 1000
+
+_queue = None
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_dropped = 0
+
+
+class ClickstreamWriter(threading.Thread):
+    """Drains the event queue into rotating clickstream-<utc time>-<pid>-<n>.jsonl files"""
+
+    def __init__(self, events, directory, max_bytes):
+        super().__init__(name='clickstream-writer', daemon=True)
+        self.events = events
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._file = None
+        self._day = None
+        self._size = 0
+        self._sequence = 0
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            record = self.events.get()
+            if record is None:
+                break
+            records = [record]
+            # Drain whatever is already queued so a burst costs one write
+            while len(records) < WRITE_BATCH_SIZE:
+                try:
+                    record = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                records.append(record)
+            self._write(records)
+        self._close()
+
+    def _write(self, records):
+        try:
+            data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode('utf-8')
+            self._rotate_if_needed(len(data))
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except Exception as e:
+            logger.error(f"Error writing {len(records)} clickstream events: {e}")
+
+    def _rotate_if_needed(self, incoming):
+        day = time.strftime('%Y%m%d', time.gmtime())
+        if self._file is not None and day == self._day and self._size + incoming <= self.max_bytes:
+            return
+        self._close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        name = f"clickstream-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}-{self._sequence}.jsonl"
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._day = day
+        self._size = 0
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _get_queue():
+    """The event queue of this process - (re)started after a fork, since threads do not survive it"""
+    global _queue, _writer, _writer_pid
+    if _writer_pid == os.getpid():
+        return _queue
+    with _writer_lock:
+        if _writer_pid != os.getpid():
+            _queue = queue.Queue(maxsize=QUEUE_SIZE)
+            _writer = ClickstreamWriter(_queue, CLICKSTREAM_DIR, CLICKSTREAM_MAX_BYTES)
+            _writer.start()
+            _writer_pid = os.getpid()
+    return _queue
+
+
+def capture_event(event, request=None, user_id=None, product_id=None, order_id=None, quantity=None, amount=None):
+    """Queue a clickstream event - never blocks, drops the event if the writer is behind"""
+    global _dropped
+    if not CLICKSTREAM_ENABLED:
+        return False
+
+    record = {'t': round(time.time(), 3), 'e': event}
+    if request is not None:
+        if request.user.is_authenticated:
+            user_id = request.user.id
+        # Only read the session key - creating a session here would mean a DB write
+        session_key = request.session.session_key
+        if session_key:
+            record['s'] = session_key
+    if user_id is not None:
+        record['u'] = user_id
+    if product_id is not None:
+        record['p'] = product_id
+    if order_id is not None:
+        record['o'] = order_id
+    if quantity is not None:
+        record['q'] = quantity
+    if amount is not None:
+        record['a'] = round(float(amount), 2)
+
+    try:
+        _get_queue().put_nowait(record)
+        return True
+    except queue.Full:
+        _dropped += 1
+        if _dropped % QUEUE_SIZE == 1:
+            logger.warning(f"Clickstream queue full - {_dropped} events dropped so far")
+        return False
+    except Exception as e:
+        logger.error(f"Error capturing clickstream event: {e}")
+        return False
+
+
+def stop_writer(timeout=5):
+    """Flush queued events and stop this process's writer thread"""
+    global _writer_pid
+    if _writer_pid != os.getpid():
+        return
+    try:
+        _queue.put(None, timeout=timeout)
+    except queue.Full:
+        logger.warning("Clickstream queue still full at shutdown - pending events lost")
+        return
+    _writer.join(timeout)
+    _writer_pid = None
+
+
+atexit.register(stop_writer)
@@ -0,0 +1,96 @@
+# products/funnel.py
+import glob
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from .clickstream import CLICKSTREAM_DIR, EVENTS
+
+EVENT_DTYPE = np.dtype([('visitor', np.int64), ('event', np.int8), ('t', np.float64)])
+
+SECONDS_PER_DAY = 86400
+
+
+def clickstream_files(directory=CLICKSTREAM_DIR, since=None):
+    """Clickstream files in time order - files rotate daily (UTC), so since filters on the name"""
+    paths = sorted(glob.glob(os.path.join(directory, 'clickstream-*.jsonl')))
+    if since:
+        cutoff = since.strftime('%Y%m%d')
+        paths = [path for path in paths if os.path.basename(path)[len('clickstream-'):][:8] >= cutoff]
+    return paths
+
+
+def load_events(paths):
+    """Stream the files into a (visitor, event, t) structured array - returns (events, number of visitors)"""
+    codes = {name: code for code, name in enumerate(EVENTS)}
+    visitors = {}
+
+    def rows():
+        for path in paths:
+            with open(path, 'rb') as events_file:
+                for line in events_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line still being written
+                    code = codes.get(record.get('e'))
+                    # Signed-in events follow the user, the rest their session
+                    key = f"u{record['u']}" if 'u' in record else (f"s{record['s']}" if 's' in record else None)
+                    if code is None or key is None:
+                        continue
+                    yield visitors.setdefault(key, len(visitors)), code, record['t']
+
+    return np.fromiter(rows(), dtype=EVENT_DTYPE), len(visitors)
+
+
+def compute_funnel(events, n_visitors):
+    """First time each visitor reached each step, counting a step only after the previous one"""
+    reached = np.full((len(EVENTS), n_visitors), np.inf)
+    previous = np.full(n_visitors, -np.inf)
+    for step in range(len(EVENTS)):
+        rows = events[events['event'] == step]
+        rows = rows[rows['t'] >= previous[rows['visitor']]]
+        np.minimum.at(reached[step], rows['visitor'], rows['t'])
+        previous = reached[step]
+    return reached
+
+
+def funnel_summary(reached):
+    """Visitors per step with step-to-step and overall conversion"""
+    counts = np.isfinite(reached).sum(axis=1)
+    summary = []
+    for step, name in enumerate(EVENTS):
+        previous = counts[step - 1] if step else counts[0]
+        summary.append({
+            'step': name,
+            'visitors': int(counts[step]),
+            'step_conversion': float(counts[step] / previous * 100) if previous else 0.0,
+            'overall_conversion': float(counts[step] / counts[0] * 100) if counts[0] else 0.0,
+        })
+    return summary
+
+
+def cohort_conversion(reached):
+    """Visitors grouped by the UTC day of their first view, with how many reached each later step"""
+    first_view = reached[0]
+    entered = np.isfinite(first_view)
+    if not entered.any():
+        return []
+
+    days = np.floor(first_view[entered] / SECONDS_PER_DAY).astype(np.int64)
+    cohort_days, cohort_index = np.unique(days, return_inverse=True)
+    sizes = np.bincount(cohort_index)
+    steps = {
+        name: np.bincount(cohort_index, weights=np.isfinite(reached[step][entered]), minlength=len(cohort_days))
+        for step, name in enumerate(EVENTS)
+    }
+
+    cohorts = []
+    for i, day in enumerate(cohort_days):
+        cohorts.append({
+            'date': datetime.fromtimestamp(int(day) * SECONDS_PER_DAY, tz=dt_timezone.utc).date(),
+            'visitors': int(sizes[i]),
+            **{name: int(steps[name][i]) for name in EVENTS[1:]},
+            'paid_conversion': float(steps['paid'][i] / sizes[i] * 100),
+        })
+    return cohorts
@@ -0,0 +1,55 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from products.clickstream import CLICKSTREAM_DIR, EVENTS
+from products.funnel import clickstream_files, cohort_conversion, compute_funnel, funnel_summary, load_events
+
+class Command(BaseCommand):
+    help = 'Compute view -> cart -> checkout -> order -> paid funnels and daily cohorts from clickstream files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=CLICKSTREAM_DIR, help='Clickstream directory')
+        parser.add_argument('--since', help='Only read files from this UTC day on (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, help='Only read files from the last N days')
+        parser.add_argument('--no-cohorts', action='store_true', help='Skip the per-day cohort table')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        elif options['days']:
+            since = timezone.now().date() - timedelta(days=options['days'] - 1)
+
+        paths = clickstream_files(options['dir'], since)
+        if not paths:
+            self.stdout.write(self.style.WARNING(f"No clickstream files in {options['dir']}"))
+            return
+
+        events, n_visitors = load_events(paths)
+        self.stdout.write(f'Read {len(events)} events from {n_visitors} visitors in {len(paths)} files')
+        reached = compute_funnel(events, n_visitors)
+
+        self.stdout.write(self.style.SUCCESS('\nFunnel'))
+        for step in funnel_summary(reached):
+            self.stdout.write(
+                f"  {step['step']:<10}{step['visitors']:>10}"
+                f"{step['step_conversion']:>10.1f}%{step['overall_conversion']:>10.1f}%"
+            )
+
+        if options['no_cohorts']:
+            return
+
+        self.stdout.write(self.style.SUCCESS('\nCohorts by first view (UTC)'))
+        self.stdout.write('  ' + f"{'date':<12}{'visitors':>10}" + ''.join(f'{name:>10}' for name in EVENTS[1:]) + f"{'paid %':>10}")
+        for cohort in cohort_conversion(reached):
+            self.stdout.write(
+                f"  {cohort['date'].isoformat():<12}{cohort['visitors']:>10}"
+                + ''.join(f'{cohort[name]:>10}' for name in EVENTS[1:])
+                + f"{cohort['paid_conversion']:>9.1f}%"
+            )
@@ -0,0 +1,13 @@
+import time
+from django.core.management.base import BaseCommand
+from products.rankings import compute_rankings
+
+class Command(BaseCommand):
+    help = 'Recompute popular/trending product rankings (run periodically, e.g. hourly, after rollup_analytics)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = compute_rankings()
+        self.stdout.write(
+            self.style.SUCCESS(f'Ranked {count} products in {time.monotonic() - started:.2f}s')
+        )
@@ -1,21 +1,103 @@
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from orders.models import SalesEvent
+from orders.sales_ledger import MATERIALIZE_BATCH_SIZE, backfill_sales_ledger, materialize_product_sales
 from products.models import Product
 
+
+def _init_worker():
+    """Each worker process needs Django set up and its own database connections"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _refresh_shard(first_id, last_id, since, batch_size):
+    """Rebuild the aggregates of products in [first_id, last_id] - runs in a worker process"""
+    return materialize_product_sales(_product_ids(since, first_id, last_id), batch_size=batch_size)
+
+
+def _product_ids(since=None, first_id=None, last_id=None):
+    """Ids of the products to refresh - only those with ledger events since the date in incremental mode"""
+    products = Product.objects.all()
+    if first_id is not None:
+        products = products.filter(pk__gte=first_id, pk__lte=last_id)
+    if since:
+        products = products.filter(pk__in=SalesEvent.objects.filter(created_at__date__gte=since).values('product_id'))
+    return products.values('pk')
+
+
 class Command(BaseCommand):
-    help = 'Refresh analytics for all products'
+    help = 'Refresh order_count/total_revenue for all products from the sales ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only refresh products with sales or reversals on/after this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=MATERIALIZE_BATCH_SIZE, help='Products per bulk_update')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Split the product id range across this many processes (not useful on SQLite)')
+        parser.add_argument('--skip-backfill', action='store_true',
+                            help='Do not record missing sales events before refreshing')
 
     def handle(self, *args, **options):
-        products = Product.objects.filter(approval_status='approved')
-        
-        for product in products:
-            analytics = product.get_analytics_data()
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Updated {product.name}: {analytics["views"]} views, '
-                    f'{analytics["orders"]} orders, Rs.{analytics["revenue"]} revenue'
-                )
+        since = None
+        if options['since']:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        started = time.monotonic()
+
+        if not options['skip_backfill']:
+            touched = backfill_sales_ledger(since)
+            self.stdout.write(f'Recorded missing sales for {len(touched)} products')
+
+        if options['workers'] > 1:
+            updated = self._refresh_sharded(since, options['workers'], options['batch_size'])
+        else:
+            updated = materialize_product_sales(
+                _product_ids(since), batch_size=options['batch_size'], progress=self._report_progress
             )
-        
+
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated analytics for {products.count()} products')
-        )
\ No newline at end of file
+            self.style.SUCCESS(
+                f'Successfully updated analytics for {updated} products in {time.monotonic() - started:.2f}s'
+            )
+        )
+
+    def _report_progress(self, done, total):
+        self.stdout.write(f'  {done}/{total} products updated')
+
+    def _refresh_sharded(self, since, workers, batch_size):
+        bounds = Product.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return 0
+
+        span = bounds['last'] - bounds['first'] + 1
+        step = -(-span // workers)
+        shards = [
+            (first_id, min(first_id + step - 1, bounds['last']))
+            for first_id in range(bounds['first'], bounds['last'] + 1, step)
+        ]
+
+        # Forked workers must not share the parent's open connections
+        connections.close_all()
+
+        updated = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(_refresh_shard, first_id, last_id, since, batch_size): (first_id, last_id)
+                for first_id, last_id in shards
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                first_id, last_id = futures[future]
+                count = future.result()
+                updated += count
+                self.stdout.write(f'  shard {done}/{len(shards)} (ids {first_id}-{last_id}): {count} products updated')
+        return updated
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from products.ratings import refresh_product_ratings
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg, rating_count and the star histogram of every product from approved reviews'
+
+    def handle(self, *args, **options):
+        updated = refresh_product_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {updated} products'))
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from orders.models import SalesEvent
+from products.models import SellerDailyStats
+from products.rollups import rollup_daily_stats
+
+class Command(BaseCommand):
+    help = 'Roll up daily product and seller analytics (views, add-to-carts, orders, units, revenue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to roll up (YYYY-MM-DD); defaults to the day before the last rollup')
+        parser.add_argument('--until', help='Last day to roll up (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--full', action='store_true', help='Roll up every day since the first recorded sale')
+
+    def handle(self, *args, **options):
+        end = self._parse(options['until'], '--until') or timezone.localdate()
+
+        if options['full']:
+            first_sale = SalesEvent.objects.aggregate(first=Min('created_at'))['first']
+            start = timezone.localdate(first_sale) if first_sale else end
+        elif options['since']:
+            start = self._parse(options['since'], '--since')
+        else:
+            # Incremental: redo the last rolled-up day too, it may have been partial
+            last = SellerDailyStats.objects.aggregate(last=Max('date'))['last']
+            start = last - timedelta(days=1) if last else end - timedelta(days=1)
+
+        if start > end:
+            raise CommandError('--since must not be after --until')
+
+        product_rows, seller_rows = rollup_daily_stats(start, end)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rolled up {product_rows} product days and {seller_rows} seller days from {start} to {end}'
+            )
+        )
+
+    def _parse(self, value, option):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            # Well formed but not a real date, e.g. 2025-02-30
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'{option} must be a date in YYYY-MM-DD format')
+        return parsed
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_productdailystats_sellerdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='products.product')),
+                ('popular_score', models.FloatField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+                ('rating_score', models.FloatField(default=0, help_text='Bayesian average rating')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='products.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', '-popular_score'], name='products_pr_categor_9935a7_idx'), models.Index(fields=['category', '-trending_score'], name='products_pr_categor_c84eb7_idx'), models.Index(fields=['-popular_score'], name='products_pr_popular_31e787_idx'), models.Index(fields=['-trending_score'], name='products_pr_trendin_0518f7_idx')],
+            },
+        ),
+    ]
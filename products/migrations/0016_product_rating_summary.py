@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+def populate_rating_summary(apps, schema_editor):
+    """Summarize existing approved reviews onto their products"""
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+
+    buckets = {
+        'rating_1': Q(rating__lt=1.5),
+        'rating_2': Q(rating__gte=1.5, rating__lt=2.5),
+        'rating_3': Q(rating__gte=2.5, rating__lt=3.5),
+        'rating_4': Q(rating__gte=3.5, rating__lt=4.5),
+        'rating_5': Q(rating__gte=4.5),
+    }
+    rows = Review.objects.filter(status=True).values('product_id').annotate(
+        rating_avg=Avg('rating'),
+        rating_count=Count('id'),
+        **{field: Count('id', filter=condition) for field, condition in buckets.items()},
+    ).order_by()
+
+    fields = ['rating_avg', 'rating_count', *buckets]
+    Product.objects.bulk_update(
+        [Product(pk=row['product_id'], **{field: row[field] or 0 for field in fields}) for row in rows],
+        fields,
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_productranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, help_text='Average rating of approved reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of approved reviews'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='products_pr_rating__a01d75_idx'),
+        ),
+        migrations.RunPython(populate_rating_summary, migrations.RunPython.noop),
+    ]
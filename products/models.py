@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
@@ -88,6 +90,20 @@ class Product(models.Model):
     order_count = models.PositiveIntegerField(default=0, help_text="Number of times this product was ordered")
     total_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text="Total revenue from this product")
 
+    # Rating summary of approved reviews - kept up to date by the Review signals below
+    rating_avg = models.FloatField(default=0, help_text="Average rating of approved reviews")
+    rating_count = models.PositiveIntegerField(default=0, help_text="Number of approved reviews")
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-rating_count']),
+        ]
+
     def get_url(self):
         if self.category and self.category.slug and self.slug:
             return reverse('products:product_detail', args=[self.category.slug, self.slug])
@@ -190,29 +206,14 @@ class Product(models.Model):
         ).select_related('variation_type').order_by('sort_order')
     
     def increment_views(self):
-        """Increment view count when product is viewed"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Increment view count when product is viewed (buffered, see products.view_counter)"""
+        from .view_counter import record_product_view
+        record_product_view(self.pk)
     
     def get_analytics_data(self):
-        """Get comprehensive analytics for this product"""
-        from orders.models import OrderItem
-        
-        # Get all order items for this product
-        order_items = OrderItem.objects.filter(
-            product=self,
-            ordered=True  # Only count completed orders
-        )
-        
-        # Calculate actual metrics
-        total_orders = order_items.count()
-        total_revenue = sum(item.quantity * item.price for item in order_items)
-        
-        # Update the stored values
-        if self.order_count != total_orders or float(self.total_revenue) != total_revenue:
-            self.order_count = total_orders
-            self.total_revenue = total_revenue
-            self.save(update_fields=['order_count', 'total_revenue'])
+        """Get analytics for this product from the stored, ledger-derived counters (read-only)"""
+        total_orders = self.order_count or 0
+        total_revenue = float(self.total_revenue or 0)
         
         return {
             'views': self.view_count,
@@ -221,6 +222,17 @@ class Product(models.Model):
             'conversion_rate': (total_orders / self.view_count * 100) if self.view_count > 0 else 0
         }
 
+    def get_rating_histogram(self):
+        """Approved review counts for 5 down to 1 stars, with their share of all reviews"""
+        return [
+            {
+                'stars': stars,
+                'count': getattr(self, f'rating_{stars}'),
+                'percent': (getattr(self, f'rating_{stars}') / self.rating_count * 100) if self.rating_count else 0,
+            }
+            for stars in range(5, 0, -1)
+        ]
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -347,4 +359,89 @@ class VariationImage(models.Model):
         ordering = ['-is_primary', 'created_at']
     
     def __str__(self):
-        return f"Image for {self.variation}"
\ No newline at end of file
+        return f"Image for {self.variation}"
+
+class ProductDailyStats(models.Model):
+    """Per-product daily rollup - views/add-to-carts come from the view counter, sales from the rollup command"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    add_to_carts = models.PositiveIntegerField(default=0)
+    # Net of reversals, so a day with more refunds than sales can go negative
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('product', 'date')
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}"
+
+
+class SellerDailyStats(models.Model):
+    """Per-seller daily rollup built from ProductDailyStats and the sales ledger"""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    add_to_carts = models.PositiveIntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('seller', 'date')
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.seller_id} on {self.date}"
+
+
+class ProductRanking(models.Model):
+    """Precomputed popularity scores, one row per product - listings order by these via the indexes"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    # Denormalized so per-category rankings are a single index range scan
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='rankings')
+    popular_score = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
+    rating_score = models.FloatField(default=0, help_text="Bayesian average rating")
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-popular_score']),
+            models.Index(fields=['category', '-trending_score']),
+            models.Index(fields=['-popular_score']),
+            models.Index(fields=['-trending_score']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: popular {self.popular_score:.2f}, trending {self.trending_score:.2f}"
+
+
+# ========== RATING SUMMARY ==========
+
+@receiver(pre_save, sender=Review)
+def remember_previous_review(sender, instance, **kwargs):
+    instance._previous_rating = (
+        Review.objects.filter(pk=instance.pk).values('product_id', 'rating', 'status').first() if instance.pk else None
+    )
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    from .ratings import add_rating, remove_rating
+    previous = getattr(instance, '_previous_rating', None)
+    current = {'product_id': instance.product_id, 'rating': instance.rating, 'status': instance.status}
+    if previous == current:
+        return
+    if previous and previous['status']:
+        remove_rating(previous['product_id'], previous['rating'])
+    if instance.status:
+        add_rating(instance.product_id, instance.rating)
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    if instance.status:
+        from .ratings import remove_rating
+        remove_rating(instance.product_id, instance.rating)
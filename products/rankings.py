@@ -0,0 +1,127 @@
+# products/rankings.py
+from collections import defaultdict
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import SalesEvent
+from .models import Product, ProductDailyStats, ProductRanking
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Popularity favours sustained sales, trending favours the last few days
+POPULAR_HALF_LIFE_DAYS = 30
+POPULAR_WINDOW_DAYS = 180
+TRENDING_HALF_LIFE_DAYS = 3
+TRENDING_WINDOW_DAYS = 14
+
+# A view is worth this fraction of a unit sold
+VIEW_WEIGHT = 0.05
+
+# Reviews a product needs before its own average outweighs the catalog average
+RATING_PRIOR_WEIGHT = 5
+DEFAULT_RATING = 3.0
+
+RANKING_BATCH_SIZE = 1000
+
+# ?sort= values served from ProductRanking
+RANKING_SORTS = {
+    'popular': 'ranking__popular_score',
+    'trending': 'ranking__trending_score',
+}
+
+
+def order_by_ranking(products, sort_by):
+    """Order a product queryset by a precomputed score - unranked products last, newest first"""
+    return products.order_by(F(RANKING_SORTS[sort_by]).desc(nulls_last=True), '-created_at')
+
+
+def bestsellers(limit=8, category=None):
+    """The most popular listed products, read from the ranking index"""
+    products = Product.objects.filter(
+        status=True,
+        admin_approved=True,
+        approval_status='approved',
+        ranking__popular_score__gt=0,
+    )
+    if category is not None:
+        products = products.filter(ranking__category=category)
+    return products.order_by('-ranking__popular_score')[:limit]
+
+
+def _decay(age_days, half_life):
+    return 0.5 ** (age_days / half_life)
+
+
+def _activity_scores(today):
+    """Time-decayed units sold plus weighted views per product, for the popular and trending windows"""
+    popular = defaultdict(float)
+    trending = defaultdict(float)
+
+    def add(product_id, day, amount):
+        age = (today - day).days
+        popular[product_id] += amount * _decay(age, POPULAR_HALF_LIFE_DAYS)
+        if age < TRENDING_WINDOW_DAYS:
+            trending[product_id] += amount * _decay(age, TRENDING_HALF_LIFE_DAYS)
+
+    start = today - timedelta(days=POPULAR_WINDOW_DAYS - 1)
+    sales = SalesEvent.objects.filter(created_at__date__gte=start).annotate(
+        day=TruncDate('created_at')
+    ).values('product_id', 'day').annotate(
+        units=Sum(F('quantity') * F('sign'), output_field=models.IntegerField())
+    ).order_by()
+    for row in sales:
+        add(row['product_id'], row['day'], row['units'] or 0)
+
+    views = ProductDailyStats.objects.filter(date__gte=start, views__gt=0).values_list('product_id', 'date', 'views')
+    for product_id, day, count in views.iterator():
+        add(product_id, day, count * VIEW_WEIGHT)
+
+    return popular, trending
+
+
+def _catalog_mean_rating():
+    """Average rating over all approved reviews, from the products' rating summaries"""
+    totals = Product.objects.filter(rating_count__gt=0).aggregate(
+        stars=Sum(F('rating_avg') * F('rating_count'), output_field=models.FloatField()),
+        reviews=Sum('rating_count'),
+    )
+    return totals['stars'] / totals['reviews'] if totals['reviews'] else DEFAULT_RATING
+
+
+def compute_rankings(today=None):
+    """Recompute every product's popular/trending scores and store them - returns the number of rows written"""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    popular, trending = _activity_scores(today)
+    mean_rating = _catalog_mean_rating()
+
+    rankings = []
+    products = Product.objects.values_list('id', 'category_id', 'rating_avg', 'rating_count')
+    for product_id, category_id, rating_avg, rating_count in products.iterator():
+        # Bayesian average - few reviews stay close to the catalog mean
+        rating = (RATING_PRIOR_WEIGHT * mean_rating + rating_avg * rating_count) / (RATING_PRIOR_WEIGHT + rating_count)
+        # Rating scales activity between 0.5x (1 star) and 1.0x (5 stars)
+        factor = 0.5 + (rating - 1) / 8
+        rankings.append(ProductRanking(
+            product_id=product_id,
+            category_id=category_id,
+            popular_score=round(max(popular.get(product_id, 0), 0) * factor, 4),
+            trending_score=round(max(trending.get(product_id, 0), 0) * factor, 4),
+            rating_score=round(rating, 3),
+            computed_at=now,
+        ))
+
+    with transaction.atomic():
+        ProductRanking.objects.bulk_create(
+            rankings,
+            batch_size=RANKING_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['category', 'popular_score', 'trending_score', 'rating_score', 'computed_at'],
+        )
+
+    logger.info(f"Computed rankings for {len(rankings)} products")
+    return len(rankings)
@@ -0,0 +1,93 @@
+# products/ratings.py
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, PositiveIntegerField, Q, Value, When
+from .models import Product, Review
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATING_FIELDS = ['rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+RATING_BATCH_SIZE = 500
+
+
+def rating_bucket(rating):
+    """Histogram column for a rating - fractional ratings go to the nearest star"""
+    return f'rating_{min(max(int(rating + 0.5), 1), 5)}'
+
+
+def add_rating(product_id, rating):
+    """Count one more approved review in the product's summary - one UPDATE, no aggregate"""
+    bucket = rating_bucket(rating)
+    # Every right-hand side sees the row's old values, so the average uses the old count
+    return Product.objects.filter(pk=product_id).update(
+        rating_avg=(F('rating_avg') * F('rating_count') + rating) / (F('rating_count') + 1),
+        rating_count=F('rating_count') + 1,
+        **{bucket: F(bucket) + 1},
+    )
+
+
+def remove_rating(product_id, rating):
+    """Take one approved review out of the product's summary - one UPDATE, no aggregate"""
+    bucket = rating_bucket(rating)
+    return Product.objects.filter(pk=product_id, rating_count__gt=0).update(
+        rating_avg=Case(
+            When(rating_count__lte=1, then=Value(0.0)),
+            default=(F('rating_avg') * F('rating_count') - rating) / (F('rating_count') - 1),
+            output_field=FloatField(),
+        ),
+        rating_count=F('rating_count') - 1,
+        **{bucket: Case(
+            When(**{f'{bucket}__gt': 0}, then=F(bucket) - 1),
+            default=Value(0),
+            output_field=PositiveIntegerField(),
+        )},
+    )
+
+
+def _bucket_filter(stars):
+    if stars == 1:
+        return Q(rating__lt=1.5)
+    if stars == 5:
+        return Q(rating__gte=4.5)
+    return Q(rating__gte=stars - 0.5, rating__lt=stars + 0.5)
+
+
+def refresh_product_ratings(product_ids=None):
+    """Recompute rating summaries from approved reviews with one GROUP BY - for the given products, or all"""
+    reviews = Review.objects.filter(status=True)
+    products = Product.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    summaries = {
+        row['product_id']: row
+        for row in reviews.values('product_id').annotate(
+            rating_avg=Avg('rating'),
+            rating_count=Count('id'),
+            **{f'rating_{stars}': Count('id', filter=_bucket_filter(stars)) for stars in range(1, 6)},
+        ).order_by()
+    }
+
+    ids = list(products.order_by('pk').values_list('pk', flat=True))
+    updated = 0
+    for start in range(0, len(ids), RATING_BATCH_SIZE):
+        batch = []
+        for product_id in ids[start:start + RATING_BATCH_SIZE]:
+            summary = summaries.get(product_id, {})
+            batch.append(Product(pk=product_id, **{field: summary.get(field) or 0 for field in RATING_FIELDS}))
+        updated += Product.objects.bulk_update(batch, RATING_FIELDS)
+    return updated
+
+
+def set_reviews_status(reviews, status):
+    """Approve or hide many reviews and refresh only the affected products - returns the number changed"""
+    with transaction.atomic():
+        changed = reviews.exclude(status=status)
+        product_ids = set(changed.values_list('product_id', flat=True))
+        updated = changed.update(status=status)
+        if product_ids:
+            refresh_product_ratings(product_ids)
+    logger.info(f"Set status={status} on {updated} reviews across {len(product_ids)} products")
+    return updated
@@ -0,0 +1,100 @@
+# products/rollups.py
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from orders.models import SalesEvent
+from .models import ProductDailyStats, SellerDailyStats
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = 1000
+
+SALES_FIELDS = ['orders', 'units', 'revenue']
+STATS_FIELDS = ['views', 'add_to_carts'] + SALES_FIELDS
+
+
+def _net_orders(field='order'):
+    """Distinct orders sold minus distinct orders reversed"""
+    return (
+        Count(field, distinct=True, filter=Q(kind='sale'))
+        - Count(field, distinct=True, filter=Q(kind='reversal'))
+    )
+
+
+def _daily_sales(group_by, start, end):
+    """Net orders/units/revenue per (group_by, day) from the ledger - one GROUP BY"""
+    return SalesEvent.objects.filter(
+        created_at__date__gte=start, created_at__date__lte=end
+    ).annotate(day=TruncDate('created_at')).values(group_by, 'day').annotate(
+        net_orders=_net_orders(),
+        net_units=Sum(F('quantity') * F('sign'), output_field=models.IntegerField()),
+        net_revenue=Sum(F('revenue') * F('sign'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by()
+
+
+def rollup_product_sales(start, end):
+    """Recompute the sales columns of ProductDailyStats for days in [start, end] - views/add-to-carts are kept"""
+    rows = [
+        ProductDailyStats(
+            product_id=row['product_id'],
+            date=row['day'],
+            orders=row['net_orders'],
+            units=row['net_units'] or 0,
+            revenue=row['net_revenue'] or Decimal('0'),
+        )
+        for row in _daily_sales('product_id', start, end)
+    ]
+
+    with transaction.atomic():
+        ProductDailyStats.objects.filter(date__gte=start, date__lte=end).update(orders=0, units=0, revenue=0)
+        ProductDailyStats.objects.bulk_create(
+            rows,
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['product', 'date'],
+            update_fields=SALES_FIELDS,
+        )
+    return len(rows)
+
+
+def rollup_seller_stats(start, end):
+    """Rebuild SellerDailyStats for days in [start, end] from the product rollups and the ledger"""
+    sellers = {}
+    product_rows = ProductDailyStats.objects.filter(
+        date__gte=start, date__lte=end, product__seller__isnull=False
+    ).values('product__seller_id', 'date').annotate(
+        total_views=Sum('views'),
+        total_add_to_carts=Sum('add_to_carts'),
+        total_units=Sum('units'),
+        total_revenue=Sum('revenue'),
+    ).order_by()
+    for row in product_rows:
+        sellers[(row['product__seller_id'], row['date'])] = SellerDailyStats(
+            seller_id=row['product__seller_id'],
+            date=row['date'],
+            views=row['total_views'] or 0,
+            add_to_carts=row['total_add_to_carts'] or 0,
+            units=row['total_units'] or 0,
+            revenue=row['total_revenue'] or Decimal('0'),
+        )
+
+    # Orders are counted per seller, since one order can hold several of the seller's products
+    for row in _daily_sales('seller_id', start, end):
+        stats = sellers.get((row['seller_id'], row['day']))
+        if stats is not None:
+            stats.orders = row['net_orders']
+
+    with transaction.atomic():
+        SellerDailyStats.objects.filter(date__gte=start, date__lte=end).delete()
+        SellerDailyStats.objects.bulk_create(sellers.values(), batch_size=ROLLUP_BATCH_SIZE)
+    return len(sellers)
+
+
+def rollup_daily_stats(start, end):
+    """Roll up product then seller daily stats for days in [start, end] - returns (product rows, seller rows)"""
+    product_rows = rollup_product_sales(start, end)
+    seller_rows = rollup_seller_stats(start, end)
+    logger.info(f"Rolled up {product_rows} product days and {seller_rows} seller days from {start} to {end}")
+    return product_rows, seller_rows
@@ -1,3 +1,66 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from .models import Category, Product, Review
+from .ratings import refresh_product_ratings, set_reviews_status
 
-# Create your tests here.
+
+class RatingSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        category = Category.objects.create(category_name='Electronics')
+        cls.phone = Product.objects.create(
+            name='Phone', price=100, description='d', stock=10, category=category, seller=cls.seller,
+            approval_status='approved', status=True, admin_approved=True,
+        )
+        cls.case = Product.objects.create(
+            name='Case', price=15, description='d', stock=10, category=category, seller=cls.seller,
+            approval_status='approved', status=True, admin_approved=True,
+        )
+
+    def review(self, product, username, rating, status=True):
+        user = User.objects.create_user(username, f'{username}@example.com', 'pw')
+        return Review.objects.create(product=product, user=user, subject='s', rating=rating, status=status)
+
+    def summary(self, product):
+        product.refresh_from_db()
+        return (round(product.rating_avg, 2), product.rating_count,
+                [product.rating_1, product.rating_2, product.rating_3, product.rating_4, product.rating_5])
+
+    def test_approved_reviews_update_the_summary(self):
+        self.review(self.phone, 'a', 5)
+        self.review(self.phone, 'b', 3)
+        self.review(self.phone, 'c', 4, status=False)
+
+        self.assertEqual(self.summary(self.phone), (4.0, 2, [0, 0, 1, 0, 1]))
+
+    def test_hiding_and_approving_reviews_in_bulk(self):
+        five = self.review(self.phone, 'a', 5)
+        self.review(self.phone, 'b', 2)
+        pending = self.review(self.phone, 'c', 4, status=False)
+        self.review(self.case, 'd', 1)
+
+        self.assertEqual(set_reviews_status(Review.objects.filter(pk=five.pk), False), 1)
+        self.assertEqual(self.summary(self.phone), (2.0, 1, [0, 1, 0, 0, 0]))
+
+        self.assertEqual(set_reviews_status(Review.objects.filter(pk__in=[five.pk, pending.pk]), True), 2)
+        self.assertEqual(self.summary(self.phone), (3.67, 3, [0, 1, 0, 1, 1]))
+
+        # Other products are left alone
+        self.assertEqual(self.summary(self.case), (1.0, 1, [1, 0, 0, 0, 0]))
+
+    def test_unchanged_reviews_are_skipped(self):
+        review = self.review(self.phone, 'a', 5)
+
+        self.assertEqual(set_reviews_status(Review.objects.filter(pk=review.pk), True), 0)
+        self.assertEqual(self.summary(self.phone), (5.0, 1, [0, 0, 0, 0, 1]))
+
+    def test_summaries_match_a_full_refresh(self):
+        reviews = [self.review(self.phone, f'u{n}', rating) for n, rating in enumerate([1, 2.5, 3.4, 4.6, 5, 5])]
+        reviews[2].delete()
+        set_reviews_status(Review.objects.filter(pk=reviews[0].pk), False)
+        incremental = self.summary(self.phone)
+
+        refresh_product_ratings([self.phone.id])
+
+        self.assertEqual(self.summary(self.phone), incremental)
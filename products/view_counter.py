@@ -0,0 +1,138 @@
+# products/view_counter.py
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Views and add-to-carts are buffered per process and written by a background thread once
+# per interval, so a burst of views on one product costs one UPDATE instead of one per view
+FLUSH_INTERVAL = getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 60)
+
+_pending = Counter()
+# (field, product_id, date) -> count, added to ProductDailyStats on flush
+_daily = Counter()
+_lock = threading.Lock()
+
+_flusher = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+class ViewFlusher(threading.Thread):
+    """Writes the buffered counts every FLUSH_INTERVAL seconds until stopped"""
+
+    def __init__(self, interval):
+        super().__init__(name='product-view-flusher', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            close_old_connections()
+            flush_product_views()
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """Start this process's flusher thread - (re)started after a fork, since threads do not survive it"""
+    global _flusher, _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher = ViewFlusher(FLUSH_INTERVAL)
+            _flusher.start()
+            _flusher_pid = os.getpid()
+
+
+def record_product_view(product_id, count=1):
+    """Buffer a view for a product - written by the flusher thread"""
+    _ensure_flusher()
+    with _lock:
+        _pending[product_id] += count
+        _daily[('views', product_id, timezone.localdate())] += count
+
+
+def record_add_to_cart(product_id, count=1):
+    """Buffer an add-to-cart for the product's daily stats"""
+    _ensure_flusher()
+    with _lock:
+        _daily[('add_to_carts', product_id, timezone.localdate())] += count
+
+
+def flush_product_views():
+    """Write all buffered views/add-to-carts with one UPDATE per field - returns the number of products updated"""
+    with _lock:
+        counts = dict(_pending)
+        daily = dict(_daily)
+        _pending.clear()
+        _daily.clear()
+
+    if not counts and not daily:
+        return 0
+
+    from .models import Product
+
+    try:
+        with transaction.atomic():
+            updated = 0
+            if counts:
+                updated = Product.objects.filter(pk__in=counts).update(view_count=Case(
+                    *[When(pk=product_id, then=F('view_count') + count) for product_id, count in counts.items()],
+                    default=F('view_count'),
+                    output_field=PositiveIntegerField(),
+                ))
+            if daily:
+                _flush_daily(daily)
+        return updated
+    except Exception as e:
+        # Put the counts back so the next flush retries them
+        logger.error(f"Error flushing product views: {e}")
+        with _lock:
+            _pending.update(counts)
+            _daily.update(daily)
+        return 0
+
+
+def _flush_daily(daily):
+    """Add buffered counts to ProductDailyStats, creating the day rows that are missing"""
+    from .models import Product, ProductDailyStats
+
+    product_ids = {product_id for _, product_id, _ in daily}
+    existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    daily = {key: count for key, count in daily.items() if key[1] in existing}
+    days = {(product_id, day) for _, product_id, day in daily}
+    ProductDailyStats.objects.bulk_create(
+        [ProductDailyStats(product_id=product_id, date=day) for product_id, day in days],
+        ignore_conflicts=True,
+    )
+
+    for field in ('views', 'add_to_carts'):
+        increments = {(product_id, day): count for (name, product_id, day), count in daily.items() if name == field}
+        if not increments:
+            continue
+        ProductDailyStats.objects.filter(
+            product_id__in={product_id for product_id, _ in increments},
+            date__in={day for _, day in increments},
+        ).update(**{field: Case(
+            *[When(product_id=product_id, date=day, then=F(field) + count) for (product_id, day), count in increments.items()],
+            default=F(field),
+            output_field=PositiveIntegerField(),
+        )})
+
+
+def stop_flusher():
+    """Stop this process's flusher thread and write what is still buffered"""
+    if _flusher is not None and _flusher_pid == os.getpid():
+        _flusher.stopped.set()
+    flush_product_views()
+
+
+atexit.register(stop_flusher)
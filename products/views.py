@@ -1,6 +1,7 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.db.models import Q, Case, When, IntegerField
 from .models import Category, Product, Review, VariationOption, VariationType, ProductVariation
+from .rankings import RANKING_SORTS, order_by_ranking
 from django.http import Http404
 from cart.models import CartItem, Cart
 from cart.views import _cart_id
@@ -95,6 +96,10 @@ def product(request, category_slug=None):
                 output_field=IntegerField()
             )
         ).order_by('has_discount', '-created_at')
+    elif sort_by in RANKING_SORTS:
+        products = order_by_ranking(products, sort_by)
+    elif sort_by == 'top_rated':
+        products = products.order_by('-rating_avg', '-rating_count', '-created_at')
     elif sort_by in ['name', '-name', 'price', '-price', '-created_at']:
         products = products.order_by(sort_by)
 
@@ -192,6 +197,10 @@ def sale_products(request):
                 output_field=IntegerField()
             )
         ).order_by('has_discount', '-created_at')
+    elif sort_by in RANKING_SORTS:
+        products = order_by_ranking(products, sort_by)
+    elif sort_by == 'top_rated':
+        products = products.order_by('-rating_avg', '-rating_count', '-created_at')
     elif sort_by in ['name', '-name', 'price', '-price', '-created_at']:
         products = products.order_by(sort_by)
 
@@ -300,6 +309,10 @@ def thrift_products(request, category_slug=None):
                 output_field=IntegerField()
             )
         ).order_by('has_discount', '-created_at')
+    elif sort_by in RANKING_SORTS:
+        products = order_by_ranking(products, sort_by)
+    elif sort_by == 'top_rated':
+        products = products.order_by('-rating_avg', '-rating_count', '-created_at')
     elif sort_by in ['name', '-name', 'price', '-price', '-created_at']:
         products = products.order_by(sort_by)
 
@@ -341,6 +354,9 @@ def product_detail(request, category_slug, product_slug):
     except Product.DoesNotExist:
         raise Http404("Product not found")
 
+    # Count the view (buffered, no write on the request path)
+    track_product_view(request, single_product)
+
     # Check if product is in user's cart
     in_cart = False
     if request.user.is_authenticated:
@@ -0,0 +1,84 @@
+# users/activity_feed.py
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .cursors import decode_cursor, encode_cursor
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Icon and badge colour per activity type, as shown on the dashboard
+ACTIVITY_STYLES = {
+    'order': ('fa-shopping-cart', 'primary'),
+    'wishlist': ('fa-heart', 'danger'),
+    'message': ('fa-comments', 'info'),
+    'product': ('fa-plus', 'success'),
+    'received': ('fa-bell', 'warning'),
+}
+
+ACTIVITY_PAGE_SIZE = 20
+
+
+def display_name(user):
+    return f"{user.first_name} {user.last_name}".strip() or user.username
+
+
+def build_activity(user_id, activity_type, message, url=''):
+    """An unsaved activity entry styled for its type"""
+    from django.apps import apps
+    ActivityFeed = apps.get_model('users', 'ActivityFeed')
+
+    icon, badge_color = ACTIVITY_STYLES[activity_type]
+    return ActivityFeed(
+        user_id=user_id,
+        activity_type=activity_type,
+        message=message[:255],
+        icon=icon,
+        badge_color=badge_color,
+        url=url,
+    )
+
+
+def record_activities(activities):
+    """Insert (user_id, activity_type, message, url) entries with one INSERT"""
+    try:
+        from django.apps import apps
+        ActivityFeed = apps.get_model('users', 'ActivityFeed')
+
+        return ActivityFeed.objects.bulk_create([
+            build_activity(user_id, activity_type, message, url)
+            for user_id, activity_type, message, url in activities
+            if user_id
+        ])
+    except Exception as e:
+        logger.error(f"Error recording activities: {e}")
+        return []
+
+
+def record_activity(user_id, activity_type, message, url=''):
+    """Add one entry to a user's activity feed"""
+    return record_activities([(user_id, activity_type, message, url)])
+
+
+def get_recent_activities(user, limit=5):
+    """The user's latest activities - one indexed query"""
+    from django.apps import apps
+    ActivityFeed = apps.get_model('users', 'ActivityFeed')
+
+    return list(ActivityFeed.objects.filter(user=user).order_by('-created_at', '-id')[:limit])
+
+
+def get_activity_page(user, cursor=None, limit=ACTIVITY_PAGE_SIZE):
+    """A page of activities older than the cursor - returns (activities, next cursor or None)"""
+    from django.apps import apps
+    ActivityFeed = apps.get_model('users', 'ActivityFeed')
+
+    activities = ActivityFeed.objects.filter(user=user)
+    position = decode_cursor(cursor, parse_datetime) if cursor else None
+    if position:
+        created_at, activity_id = position
+        activities = activities.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=activity_id))
+
+    # One extra row tells whether another page exists
+    page = list(activities.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1].created_at.isoformat(), page[limit - 1].id) if len(page) > limit else None
+    return page[:limit], next_cursor
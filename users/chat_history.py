@@ -0,0 +1,33 @@
+# users/chat_history.py
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .cursors import decode_cursor, encode_cursor
+from .models import ChatMessage
+
+# Messages shown when a chat opens, and per "load older" request
+CHAT_HISTORY_PAGE_SIZE = 50
+
+
+def encode_message_cursor(message):
+    return encode_cursor(message.timestamp.isoformat(), message.id)
+
+
+def decode_message_cursor(cursor):
+    """(timestamp, id) from a cursor - None if it is malformed"""
+    return decode_cursor(cursor, parse_datetime)
+
+
+def get_message_page(chat_room_id, cursor=None, limit=CHAT_HISTORY_PAGE_SIZE):
+    """The latest messages before the cursor, oldest first - returns (messages, cursor for older ones or None)"""
+    messages = ChatMessage.objects.filter(chat_room_id=chat_room_id).select_related('sender__profile')
+    if cursor:
+        timestamp, message_id = cursor
+        messages = messages.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+    # Walks the (chat_room, timestamp, id) index backwards; one extra row tells whether older ones exist
+    page = list(messages.order_by('-timestamp', '-id')[:limit + 1])
+    older_cursor = encode_message_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    page.reverse()
+    return page, older_cursor
+
@@ -0,0 +1,137 @@
+# users/chat_search.py
+import re
+from django.db import connection
+from django.utils.html import escape
+from .cursors import decode_cursor, encode_cursor
+from .models import ChatMessage
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHAT_SEARCH_PAGE_SIZE = 20
+
+# SQLite FTS5 index over ChatMessage.message, kept in sync by triggers on the message table.
+# Table rebuilds (some ALTERs on SQLite) drop the triggers - run `manage.py rebuild_chat_search` after one.
+# Migration users 0019 creates the same schema from its own copy of the SQL
+FTS_TABLE = 'users_chatmessage_fts'
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        message, content='users_chatmessage', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON users_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON users_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF message ON users_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message);
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+]
+
+# Snippet markers - the snippet is HTML-escaped before they become <mark> tags
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+def uses_fts(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def install_search_index(conn=connection, rebuild=True):
+    """Create the FTS table and its triggers if missing, and re-index every message"""
+    if not uses_fts(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """An FTS5 query matching every word of the user's input as a prefix - None if it has no words"""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words) if words else None
+
+
+def encode_search_cursor(rank, message_id):
+    return encode_cursor(repr(rank), message_id)
+
+
+def decode_search_cursor(cursor):
+    """(rank, message id) from a cursor - None if it is malformed"""
+    return decode_cursor(cursor, float)
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _ranked_hits(user, expression, position, limit):
+    """(message id, rank, snippet) of the best matches in the user's chats, after position"""
+    sql = f"""
+        SELECT m.id, bm25({FTS_TABLE}) AS score,
+               snippet({FTS_TABLE}, 0, %s, %s, '…', 12)
+        FROM {FTS_TABLE}
+        JOIN users_chatmessage m ON m.id = {FTS_TABLE}.rowid
+        JOIN users_chatroom_participants p ON p.chatroom_id = m.chat_room_id AND p.user_id = %s
+        WHERE {FTS_TABLE} MATCH %s
+    """
+    params = [_MARK_START, _MARK_END, user.id, expression]
+    if position:
+        # bm25 is lower for better matches, so pages continue upwards from the cursor
+        sql += f" AND (bm25({FTS_TABLE}) > %s OR (bm25({FTS_TABLE}) = %s AND m.id > %s))"
+        params += [position[0], position[0], position[1]]
+    sql += " ORDER BY score, m.id LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(message_id, rank, _highlight(snippet)) for message_id, rank, snippet in cursor.fetchall()]
+
+
+def _substring_hits(user, query, position, limit):
+    """Newest-first substring matches, for databases without the FTS index"""
+    messages = ChatMessage.objects.filter(chat_room__participants=user, message__icontains=query)
+    if position:
+        messages = messages.filter(id__lt=position[1])
+    return [
+        (message_id, 0.0, _highlight(text[:120]))
+        for message_id, text in messages.order_by('-id').values_list('id', 'message')[:limit]
+    ]
+
+
+def search_messages(user, query, cursor=None, limit=CHAT_SEARCH_PAGE_SIZE):
+    """Ranked matches for query in the user's chats - returns (hits, next cursor or None)"""
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+
+    position = decode_search_cursor(cursor) if cursor else None
+    if uses_fts():
+        hits = _ranked_hits(user, expression, position, limit + 1)
+    else:
+        hits = _substring_hits(user, query.strip(), position, limit + 1)
+    next_cursor = None
+    if len(hits) > limit:
+        last_id, last_rank = hits[limit - 1][:2]
+        next_cursor = encode_search_cursor(last_rank, last_id)
+    hits = hits[:limit]
+
+    messages = ChatMessage.objects.select_related('sender', 'chat_room__product').in_bulk([hit[0] for hit in hits])
+    results = []
+    for message_id, rank, snippet in hits:
+        message = messages[message_id]
+        results.append({
+            'message_id': message_id,
+            'chat_id': message.chat_room_id,
+            'product': message.chat_room.product.name if message.chat_room.product else None,
+            'sender_name': message.sender.get_full_name() or message.sender.username,
+            'is_mine': message.sender_id == user.id,
+            'snippet': snippet,
+            'timestamp': message.get_time_display(),
+            'rank': rank,
+        })
+    return results, next_cursor
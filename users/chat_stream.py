@@ -0,0 +1,96 @@
+# users/chat_stream.py
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .event_stream import (
+    STREAM_HEARTBEAT_SECONDS, get_channel_versions, notify_channel, sse_event, wait_for_change,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A stream is closed after this long and the browser reconnects with Last-Event-ID
+CHAT_STREAM_MAX_SECONDS = getattr(settings, 'CHAT_STREAM_MAX_SECONDS', 300)
+
+# While someone is typing, re-read typing state this often so expired indicators disappear
+TYPING_CHECK_SECONDS = 2
+
+
+def room_channel(room_id):
+    return f'chat:{room_id}'
+
+
+def notify_chat_room(room_id):
+    """Wake every stream of the room"""
+    notify_channel(room_channel(room_id))
+
+
+def message_payload(msg, user):
+    """A chat message as sent to the browser"""
+    return {
+        'id': msg.id,
+        'message': msg.message,
+        'sender': msg.sender.username,
+        'sender_name': msg.sender.get_full_name() or msg.sender.username,
+        'timestamp': msg.get_time_display(),
+        'status_icon': msg.get_status_icon(),
+        'is_mine': msg.sender_id == user.id,
+        'image': msg.image.url if msg.image else None,
+    }
+
+
+def _new_messages(room_id, user, last_id):
+    """Messages of the other participants after last_id, marked read as they are delivered"""
+    from .models import ChatMessage
+
+    new_messages = list(
+        ChatMessage.objects.filter(chat_room_id=room_id, id__gt=last_id)
+        .exclude(sender=user).select_related('sender').order_by('id')
+    )
+    if new_messages:
+        from .read_receipts import mark_chat_read
+        mark_chat_read(room_id, user, up_to_id=new_messages[-1].id)
+        for msg in new_messages:
+            msg.is_read, msg.status = True, 'read'
+    return [message_payload(msg, user) for msg in new_messages]
+
+
+def _other_participant_ids(room_id, user):
+    from .models import ChatParticipant
+    return list(ChatParticipant.objects.filter(chat_room_id=room_id).exclude(user_id=user.id).values_list('user_id', flat=True))
+
+
+async def chat_event_stream(room_id, user, last_id=0):
+    """Server-Sent Events for a chat room - 'message' per new message and 'typing' when the typing users change"""
+    from .typing_indicators import get_typing_users
+
+    deadline = time.monotonic() + CHAT_STREAM_MAX_SECONDS
+    other_ids = await sync_to_async(_other_participant_ids)(room_id, user)
+    channels = (room_channel(room_id),)
+    typing = []
+    version = None
+
+    yield 'retry: 3000\n\n'
+    while True:
+        current = await sync_to_async(get_channel_versions)(channels)
+        changed = current != version
+        if changed:
+            version = current
+            for payload in await sync_to_async(_new_messages)(room_id, user, last_id):
+                last_id = payload['id']
+                yield sse_event('message', payload, event_id=last_id)
+
+        # An idle room is not queried at all until its version changes
+        if changed or typing:
+            typing_now = await sync_to_async(get_typing_users)(room_id, other_ids)
+            if typing_now != typing:
+                typing = typing_now
+                yield sse_event('typing', {'typing_users': typing})
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # While someone is typing, wake up in time to let their indicator expire
+        timeout = min(remaining, TYPING_CHECK_SECONDS if typing else STREAM_HEARTBEAT_SECONDS)
+        if not await wait_for_change(channels, version, timeout):
+            yield ': keep-alive\n\n'
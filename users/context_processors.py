@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from .notification_utils import get_unread_notification_count
+
+def notifications(request):
+    """Unread notification count (cached) and whether pages can open the notification stream"""
+    if 'admin' in request.path or not request.user.is_authenticated:
+        return {}
+    return {
+        'unread_notifications': get_unread_notification_count(request.user),
+        'notification_stream': settings.NOTIFICATION_STREAM_ENABLED and isinstance(request, ASGIRequest),
+    }
@@ -0,0 +1,17 @@
+# users/cursors.py
+import base64
+
+
+def encode_cursor(value, row_id):
+    """An opaque keyset cursor for the row at (value, row_id)"""
+    return base64.urlsafe_b64encode(f"{value}|{row_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, parse_value):
+    """(value, row id) from a cursor, with value converted by parse_value - None if either part is malformed"""
+    try:
+        value, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        value = parse_value(value)
+        return (value, int(row_id)) if value is not None else None
+    except (ValueError, UnicodeError):
+        return None
@@ -0,0 +1,111 @@
+# users/dashboard.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from products.models import Product
+from .activity_feed import get_recent_activities
+from .models import Wishlist
+from .notification_utils import get_recent_notifications, get_unread_notification_count
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dashboard data is cached per user for a short time and dropped whenever an
+# order, order item, wishlist item, chat message, product or notification of the user changes
+DASHBOARD_CACHE_TTL = getattr(settings, 'DASHBOARD_CACHE_TTL', 60)
+
+
+def dashboard_cache_key(user_id):
+    return f'dashboard:{user_id}'
+
+
+def invalidate_dashboard(*user_ids):
+    """Drop the cached dashboard data of these users"""
+    keys = [dashboard_cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_order_dashboards(order_ids):
+    """Drop the cached dashboards of the buyers and sellers of these orders once the transaction commits.
+
+    Deleting earlier would let a concurrent dashboard request re-cache the pre-commit data.
+    """
+    user_ids = set(Order.objects.filter(id__in=order_ids).values_list('user_id', flat=True))
+    user_ids.update(OrderItem.objects.filter(order_id__in=order_ids).values_list('seller_id', flat=True))
+    transaction.on_commit(lambda: invalidate_dashboard(*user_ids))
+
+
+def get_dashboard_data(user, profile):
+    """Cached dashboard data for the user - loaded by load_dashboard_data on a miss"""
+    key = dashboard_cache_key(user.id)
+    data = cache.get(key)
+    if data is None:
+        data = load_dashboard_data(user, profile)
+        cache.set(key, data, DASHBOARD_CACHE_TTL)
+    return data
+
+
+def load_dashboard_data(user, profile):
+    """Load every dashboard count, stat and recent activity with batched queries"""
+    is_seller = profile.seller_status == 'approved'
+
+    data = {
+        'orders_count': Order.objects.filter(user=user).count(),
+        'received_orders_count': 0,
+        'pending_qr_count': 0,
+        'unread_messages_count': profile.get_unread_messages_count(),
+        'wishlist_count': Wishlist.objects.filter(user=user).count(),
+        'seller_stats': {},
+    }
+
+    if is_seller:
+        # Received items and orders awaiting QR verification in one conditional aggregate
+        received = OrderItem.objects.filter(seller=user).aggregate(
+            received_orders_count=Count('id'),
+            pending_qr_count=Count(
+                'order',
+                distinct=True,
+                filter=Q(order__payment_method='QR Payment', order__payment_status='pending_verification'),
+            ),
+        )
+        data.update(received)
+
+        approved = Q(approval_status='approved')
+        analytics = Product.objects.filter(seller=user).aggregate(
+            total_products=Count('id', filter=approved),
+            total_views=Sum('view_count', filter=approved),
+            total_orders=Sum('order_count', filter=approved),
+            total_revenue=Sum('total_revenue', filter=approved),
+        )
+        total_views = analytics['total_views'] or 0
+        total_orders = analytics['total_orders'] or 0
+        data['seller_stats'] = {
+            'total_products': analytics['total_products'],
+            'total_views': total_views,
+            'total_orders': total_orders,
+            'total_revenue': float(analytics['total_revenue'] or 0),
+            'avg_conversion': (total_orders / total_views * 100) if total_views > 0 else 0,
+        }
+
+    data['recent_activities'] = _recent_activities(user, is_seller, data['pending_qr_count'])
+    data['notifications'] = list(get_recent_notifications(user, limit=10))
+    data['total_notifications'] = get_unread_notification_count(user)
+    return data
+
+
+def _recent_activities(user, is_seller, pending_qr_count):
+    """The five latest feed entries, led by the pending QR reminder for sellers"""
+    activities = get_recent_activities(user, limit=5)
+
+    if is_seller and pending_qr_count > 0:
+        activities.insert(0, {
+            'message': f'{pending_qr_count} QR payment(s) awaiting verification',
+            'created_at': timezone.now(),
+            'icon': 'fa-qrcode',
+            'badge_color': 'warning'
+        })
+    return activities[:5]
@@ -0,0 +1,96 @@
+# users/event_stream.py
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting stream re-reads its channel version from the shared cache - picks up
+# changes made by other worker processes, which cannot wake it directly
+STREAM_CHECK_SECONDS = 5
+
+# Channel versions expire after this long without a change, so keys of users who never open a
+# stream don't pile up. It is far above STREAM_CHECK_SECONDS - an expired version merely reads
+# as a change, costing a waiting stream one extra check
+STREAM_VERSION_TIMEOUT = 10 * 60
+
+# Keep-alive comment interval, so proxies don't drop idle connections
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Streams waiting in this process: channel -> {(event loop, asyncio.Event)}
+_waiters = defaultdict(set)
+_waiters_lock = threading.Lock()
+
+
+def channel_version_key(channel):
+    return f'stream:version:{channel}'
+
+
+def get_channel_versions(channels):
+    """The current version of each channel, in order - one cache read"""
+    keys = [channel_version_key(channel) for channel in channels]
+    versions = cache.get_many(keys)
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+def notify_channels(*channels):
+    """Give each channel a new version and wake every stream of the channels in this process"""
+    # Versions are only compared for equality, so a fresh token is set instead of incrementing -
+    # one set_many however many channels change
+    version = uuid.uuid4().hex
+    cache.set_many({channel_version_key(channel): version for channel in channels}, STREAM_VERSION_TIMEOUT)
+
+    with _waiters_lock:
+        waiters = [waiter for channel in channels for waiter in _waiters.get(channel, ())]
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The stream's event loop is already closed
+            pass
+
+
+def notify_channel(channel):
+    notify_channels(channel)
+
+
+async def wait_for_change(channels, versions, timeout):
+    """Wait until any channel's version differs from versions (as returned by get_channel_versions) - False on timeout"""
+    event = asyncio.Event()
+    waiter = (asyncio.get_running_loop(), event)
+    with _waiters_lock:
+        for channel in channels:
+            _waiters[channel].add(waiter)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, STREAM_CHECK_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            if await sync_to_async(get_channel_versions)(channels) != versions:
+                return True
+    finally:
+        with _waiters_lock:
+            for channel in channels:
+                _waiters[channel].discard(waiter)
+                if not _waiters[channel]:
+                    del _waiters[channel]
+
+
+def sse_event(event, data, event_id=None):
+    """One Server-Sent Event frame"""
+    frame = f'event: {event}\n'
+    if event_id is not None:
+        frame += f'id: {event_id}\n'
+    return frame + f'data: {json.dumps(data)}\n\n'
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from orders.models import OrderItem
+from products.models import Category
+from users.notification_utils import NOTIFICATION_BATCH_SIZE, notify_users
+
+AUDIENCES = ['all', 'sellers', 'buyers']
+
+class Command(BaseCommand):
+    help = 'Send a notification to every user in an audience - all users, approved sellers, or buyers (optionally of one category)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('title', help='Notification title')
+        parser.add_argument('message', help='Notification text')
+        parser.add_argument('--audience', choices=AUDIENCES, default='all', help='Who receives it (default: all)')
+        parser.add_argument('--category', help='With --audience buyers: only users who ordered from this category (slug)')
+        parser.add_argument('--url', default='', help='Link opened from the notification')
+        parser.add_argument('--icon', default='fa-bullhorn', help='Font Awesome icon (default: fa-bullhorn)')
+        parser.add_argument('--color', default='info', help='Badge colour (default: info)')
+        parser.add_argument('--batch-size', type=int, default=NOTIFICATION_BATCH_SIZE, help='Notifications per INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the audience')
+
+    def audience(self, options):
+        """Recipient user ids, as a queryset streamed in batches"""
+        if options['category'] and options['audience'] != 'buyers':
+            raise CommandError('--category only applies to --audience buyers')
+
+        if options['audience'] == 'sellers':
+            users = User.objects.filter(is_active=True, profile__seller_status='approved').values_list('id', flat=True).order_by('id')
+        elif options['audience'] == 'buyers':
+            items = OrderItem.objects.filter(ordered=True, order__user__is_active=True)
+            if options['category']:
+                try:
+                    category = Category.objects.get(slug=options['category'])
+                except Category.DoesNotExist:
+                    raise CommandError(f"Category '{options['category']}' not found")
+                items = items.filter(product__category=category)
+            users = items.values_list('order__user_id', flat=True).order_by('order__user_id').distinct()
+        else:
+            users = User.objects.filter(is_active=True).values_list('id', flat=True).order_by('id')
+        return users
+
+    def handle(self, *args, **options):
+        users = self.audience(options)
+
+        if options['dry_run']:
+            self.stdout.write(f"Would notify {users.count()} users")
+            return
+
+        # Ids are streamed from the database and inserted a batch at a time
+        sent = notify_users(
+            users.iterator(chunk_size=options['batch_size']),
+            notification_type='system',
+            title=options['title'],
+            message=options['message'],
+            icon=options['icon'],
+            color=options['color'],
+            url=options['url'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Sent the notification to {sent} users"))
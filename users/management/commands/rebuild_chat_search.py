@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from users.chat_search import install_search_index, uses_fts
+
+class Command(BaseCommand):
+    help = 'Recreate the chat message search index and its triggers, and re-index every message'
+
+    def handle(self, *args, **options):
+        if not uses_fts():
+            self.stdout.write(self.style.WARNING('Chat search uses plain substring matching on this database - nothing to rebuild'))
+            return
+        install_search_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the chat message search index'))
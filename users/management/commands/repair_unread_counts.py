@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from users.read_receipts import refresh_unread_counts
+
+class Command(BaseCommand):
+    help = 'Recompute every chat participant\'s unread count and every user\'s unread message total from the read watermarks'
+
+    def handle(self, *args, **options):
+        updated = refresh_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed unread message counts for {updated} users'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_chatmessage_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('order', 'Order Placed'), ('wishlist', 'Wishlist Addition'), ('message', 'Message Received'), ('product', 'Product Added'), ('received', 'Order Received')], max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('icon', models.CharField(default='fa-bell', max_length=50)),
+                ('badge_color', models.CharField(default='primary', max_length=20)),
+                ('url', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='users_activ_user_id_9d41dd_idx')],
+            },
+        ),
+    ]
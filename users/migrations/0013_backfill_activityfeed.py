@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+def backfill_activity_feed(apps, schema_editor):
+    """Seed every user's activity feed from existing orders, wishlists, messages and products"""
+    ActivityFeed = apps.get_model('users', 'ActivityFeed')
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    Wishlist = apps.get_model('users', 'Wishlist')
+    ChatMessage = apps.get_model('users', 'ChatMessage')
+    ChatRoom = apps.get_model('users', 'ChatRoom')
+
+    def activity(user_id, activity_type, message, icon, badge_color, url, created_at):
+        return ActivityFeed(
+            user_id=user_id,
+            activity_type=activity_type,
+            message=message[:255],
+            icon=icon,
+            badge_color=badge_color,
+            url=url,
+            created_at=created_at,
+        )
+
+    def entries():
+        for order in Order.objects.only('id', 'user_id', 'created_at').iterator():
+            yield activity(order.user_id, 'order', f'Order #{order.id} placed successfully',
+                           'fa-shopping-cart', 'primary', '/orders/my-orders/', order.created_at)
+
+        items = OrderItem.objects.filter(seller__isnull=False).values('seller_id', 'product__name', 'order__created_at')
+        for item in items.iterator():
+            yield activity(item['seller_id'], 'received', f'New order received for "{item["product__name"]}"',
+                           'fa-bell', 'warning', '/users/seller/orders/', item['order__created_at'])
+
+        for product in Product.objects.filter(seller__isnull=False).only('name', 'seller_id', 'created_at').iterator():
+            yield activity(product.seller_id, 'product', f'Product "{product.name}" added for review',
+                           'fa-plus', 'success', '/users/my-selling-items/', product.created_at)
+
+        for item in Wishlist.objects.values('user_id', 'product__name', 'added_at').iterator():
+            yield activity(item['user_id'], 'wishlist', f'Added "{item["product__name"]}" to wishlist',
+                           'fa-heart', 'danger', '/users/wishlist/', item['added_at'])
+
+        messages = ChatMessage.objects.values(
+            'chat_room_id', 'sender_id', 'sender__first_name', 'sender__last_name', 'sender__username', 'timestamp'
+        )
+        Participants = ChatRoom.participants.through
+        room_users = {}
+        for row in Participants.objects.values('chatroom_id', 'user_id').iterator():
+            room_users.setdefault(row['chatroom_id'], []).append(row['user_id'])
+        for msg in messages.iterator():
+            name = f"{msg['sender__first_name']} {msg['sender__last_name']}".strip() or msg['sender__username']
+            for user_id in room_users.get(msg['chat_room_id'], []):
+                if user_id != msg['sender_id']:
+                    yield activity(user_id, 'message', f'New message from {name}',
+                                   'fa-comments', 'info', f"/users/chat/{msg['chat_room_id']}/", msg['timestamp'])
+
+    ActivityFeed.objects.bulk_create(entries(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_activityfeed'),
+        ('orders', '0012_backfill_salesevent'),
+        ('products', '0014_productdailystats_sellerdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_activity_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    """Start each participant's watermark just below the first message they have not read"""
+    ChatMessage = apps.get_model('users', 'ChatMessage')
+    ChatParticipant = apps.get_model('users', 'ChatParticipant')
+
+    # Per room and sender: the last message, and the first one still unread
+    senders = {}
+    rows = ChatMessage.objects.values('chat_room_id', 'sender_id').annotate(
+        last_id=Max('id'),
+        first_unread_id=Min('id', filter=Q(is_read=False)),
+    ).order_by()
+    for row in rows:
+        senders.setdefault(row['chat_room_id'], []).append(row)
+
+    memberships = []
+    for membership in ChatParticipant.objects.all().iterator():
+        others = [row for row in senders.get(membership.chat_room_id, []) if row['sender_id'] != membership.user_id]
+        if not others:
+            continue
+        unread = [row['first_unread_id'] for row in others if row['first_unread_id']]
+        membership.last_read_message_id = min(unread) - 1 if unread else max(row['last_id'] for row in others)
+        memberships.append(membership)
+
+    ChatParticipant.objects.bulk_update(memberships, ['last_read_message_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_backfill_activityfeed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The implicit participants table becomes ChatParticipant as is - only the state changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ChatParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('chat_room', models.ForeignKey(db_column='chatroom_id', on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='users.chatroom')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'users_chatroom_participants',
+                        'unique_together': {('chat_room', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chatroom',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='chat_rooms', through='users.ChatParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+    ]
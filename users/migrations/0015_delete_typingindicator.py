@@ -0,0 +1,16 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_chatparticipant'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='TypingIndicator',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:09
+
+from django.db import migrations, models
+
+
+def backfill_participant_keys(apps, schema_editor):
+    """Key every existing two-person chat - when a pair already has duplicate rooms, the oldest keeps the key"""
+    ChatRoom = apps.get_model('users', 'ChatRoom')
+    ChatParticipant = apps.get_model('users', 'ChatParticipant')
+
+    participants = {}
+    for row in ChatParticipant.objects.values('chat_room_id', 'user_id').iterator():
+        participants.setdefault(row['chat_room_id'], []).append(row['user_id'])
+
+    keyed, seen = [], set()
+    for room_id, product_id in ChatRoom.objects.order_by('id').values_list('id', 'product_id'):
+        users = participants.get(room_id, [])
+        if len(users) != 2:
+            continue
+        low, high = sorted(users)
+        key = f"{low}:{high}:{product_id}" if product_id else f"{low}:{high}"
+        if key not in seen:
+            seen.add(key)
+            keyed.append(ChatRoom(id=room_id, participant_key=key))
+
+    ChatRoom.objects.bulk_update(keyed, ['participant_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_delete_typingindicator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='participant_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_participant_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_chatroom_participant_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat_room', 'timestamp', 'id'], name='users_chatm_chat_ro_736cc9_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_counts(apps, schema_editor):
+    """Count what each participant has not read past their watermark, and total it per user"""
+    ChatParticipant = apps.get_model('users', 'ChatParticipant')
+    ChatMessage = apps.get_model('users', 'ChatMessage')
+    Profile = apps.get_model('users', 'Profile')
+
+    unread = ChatMessage.objects.filter(
+        chat_room=OuterRef('chat_room'), id__gt=OuterRef('last_read_message_id')
+    ).exclude(sender=OuterRef('user')).order_by().values('chat_room').annotate(count=Count('id')).values('count')
+    ChatParticipant.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+    total = ChatParticipant.objects.filter(
+        user=OuterRef('user')
+    ).order_by().values('user').annotate(total=Sum('unread_count')).values('total')
+    Profile.objects.update(unread_messages_total=Coalesce(Subquery(total), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_chatmessage_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='unread_messages_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL applied on SQLite only - other databases have no FTS5 and search falls back to icontains"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_chatparticipant_unread_count'),
+    ]
+
+    operations = [
+        # FTS5 index of chat messages kept in sync by triggers, filled from the existing ones
+        SQLiteRunSQL(
+            sql=[
+                """CREATE VIRTUAL TABLE IF NOT EXISTS users_chatmessage_fts USING fts5(
+                    message, content='users_chatmessage', content_rowid='id', tokenize='porter unicode61'
+                )""",
+                """CREATE TRIGGER IF NOT EXISTS users_chatmessage_fts_insert AFTER INSERT ON users_chatmessage BEGIN
+                    INSERT INTO users_chatmessage_fts(rowid, message) VALUES (new.id, new.message);
+                END""",
+                """CREATE TRIGGER IF NOT EXISTS users_chatmessage_fts_delete AFTER DELETE ON users_chatmessage BEGIN
+                    INSERT INTO users_chatmessage_fts(users_chatmessage_fts, rowid, message) VALUES ('delete', old.id, old.message);
+                END""",
+                """CREATE TRIGGER IF NOT EXISTS users_chatmessage_fts_update AFTER UPDATE OF message ON users_chatmessage BEGIN
+                    INSERT INTO users_chatmessage_fts(users_chatmessage_fts, rowid, message) VALUES ('delete', old.id, old.message);
+                    INSERT INTO users_chatmessage_fts(rowid, message) VALUES (new.id, new.message);
+                END""",
+                "INSERT INTO users_chatmessage_fts(users_chatmessage_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS users_chatmessage_fts_insert",
+                "DROP TRIGGER IF EXISTS users_chatmessage_fts_delete",
+                "DROP TRIGGER IF EXISTS users_chatmessage_fts_update",
+                "DROP TABLE IF EXISTS users_chatmessage_fts",
+            ],
+        ),
+    ]
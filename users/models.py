@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -72,6 +72,8 @@ class Profile(models.Model):
     #  Chat activity tracking
     last_seen = models.DateTimeField(default=timezone.now)
     is_online = models.BooleanField(default=False)
+    # Sum of the user's ChatParticipant.unread_count - kept in step by users/read_receipts.py
+    unread_messages_total = models.PositiveIntegerField(default=0)
 
 # Wishlist
 
@@ -106,10 +108,7 @@ class Profile(models.Model):
     
     def get_unread_messages_count(self):
         """Get count of unread messages for this user"""
-        return ChatMessage.objects.filter(
-            chat_room__participants=self.user,
-            is_read=False
-        ).exclude(sender=self.user).count()
+        return self.unread_messages_total
     
     def update_last_seen(self):
         """Update last seen timestamp"""
@@ -118,7 +117,7 @@ class Profile(models.Model):
 
 
 class ChatRoom(models.Model):
-    participants = models.ManyToManyField(User, related_name='chat_rooms')
+    participants = models.ManyToManyField(User, related_name='chat_rooms', through='ChatParticipant')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -129,11 +128,29 @@ class ChatRoom(models.Model):
     is_active = models.BooleanField(default=True)
     archived_by = models.ManyToManyField(User, related_name='archived_chats', blank=True)
     
+    # Sorted user ids (plus product id) of a two-person chat - one room per pair and product
+    participant_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    
     def __str__(self):
         participant_names = ", ".join([user.username for user in self.participants.all()])
         product_info = f" (About: {self.product.name})" if self.product else ""
         return f"Chat: {participant_names}{product_info}"
     
+    @staticmethod
+    def make_participant_key(user_id, other_user_id, product_id=None):
+        low, high = sorted([user_id, other_user_id])
+        return f"{low}:{high}:{product_id}" if product_id else f"{low}:{high}"
+    
+    @classmethod
+    def get_or_create_direct(cls, user, other_user, product=None):
+        """The chat between two users (about a product, if given) - created with both participants if missing"""
+        key = cls.make_participant_key(user.id, other_user.id, product.id if product else None)
+        with transaction.atomic():
+            chat_room, created = cls.objects.get_or_create(participant_key=key, defaults={'product': product})
+            if created:
+                chat_room.participants.add(user, other_user)
+        return chat_room, created
+    
     def get_other_participant(self, current_user):
         """Get the other participant in a 2-person chat"""
         try:
@@ -150,9 +167,7 @@ class ChatRoom(models.Model):
     
     def get_unread_count_for_user(self, user):
         """Get unread message count for specific user"""
-        return self.messages.filter(
-            is_read=False
-        ).exclude(sender=user).count()
+        return self.memberships.filter(user=user).values_list('unread_count', flat=True).first() or 0
 
 
 class ChatMessage(models.Model):
@@ -188,6 +203,9 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['chat_room', 'timestamp', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.message[:50]}"
@@ -228,18 +246,22 @@ class ChatMessage(models.Model):
             return "just now"
 
 
-# NEW: Typing indicator model
-class TypingIndicator(models.Model):
-    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='typing_indicators')
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
-    
+class ChatParticipant(models.Model):
+    """A user's membership of a chat, with their unread counter and read watermark"""
+    # Same table and columns as the implicit participants table this replaced
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='memberships', db_column='chatroom_id')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memberships')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
+        db_table = 'users_chatroom_participants'
         unique_together = ['chat_room', 'user']
-    
+
     def __str__(self):
-        return f"{self.user.username} typing in {self.chat_room}"
-        
+        return f"{self.user.username} in chat {self.chat_room_id} ({self.unread_count} unread)"
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('system', 'System'),
@@ -331,4 +353,94 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+class ActivityFeed(models.Model):
+    """Per-user activity entries written when the event happens - read newest first"""
+    ACTIVITY_TYPES = [
+        ('order', 'Order Placed'),
+        ('wishlist', 'Wishlist Addition'),
+        ('message', 'Message Received'),
+        ('product', 'Product Added'),
+        ('received', 'Order Received'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
+    message = models.CharField(max_length=255)
+    icon = models.CharField(max_length=50, default='fa-bell')
+    badge_color = models.CharField(max_length=20, default='primary')
+    url = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.message}"
+
+
+# ========== CACHE INVALIDATION AND ACTIVITY FEED ==========
+# One receiver per model - dashboard keys are dropped with a single delete_many per save
+
+def _invalidate_dashboard(*user_ids):
+    from .dashboard import invalidate_dashboard
+    invalidate_dashboard(*user_ids)
+
+@receiver([post_save, post_delete], sender='orders.Order')
+def order_changed(sender, instance, created=False, **kwargs):
+    if created:
+        from .activity_feed import record_activity
+        record_activity(instance.user_id, 'order', f'Order #{instance.id} placed successfully', '/orders/my-orders/')
+    # Sellers see received orders and pending QR payments on their dashboard
+    seller_ids = instance.items.values_list('seller_id', flat=True) if instance.pk else []
+    _invalidate_dashboard(instance.user_id, *seller_ids)
+
+@receiver([post_save, post_delete], sender='orders.OrderItem')
+def order_item_changed(sender, instance, created=False, **kwargs):
+    if created:
+        from .activity_feed import record_activity
+        record_activity(instance.seller_id, 'received', f'New order received for "{instance.product.name}"', '/users/seller/orders/')
+    _invalidate_dashboard(instance.seller_id)
+
+@receiver([post_save, post_delete], sender='products.Product')
+def product_changed(sender, instance, created=False, **kwargs):
+    if created:
+        from .activity_feed import record_activity
+        record_activity(instance.seller_id, 'product', f'Product "{instance.name}" added for review', '/users/my-selling-items/')
+    _invalidate_dashboard(instance.seller_id)
+
+@receiver([post_save, post_delete], sender=Wishlist)
+def wishlist_changed(sender, instance, created=False, **kwargs):
+    if created:
+        from .activity_feed import record_activity
+        record_activity(instance.user_id, 'wishlist', f'Added "{instance.product.name}" to wishlist', '/users/wishlist/')
+    _invalidate_dashboard(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    # Drops the cached unread count and dashboard, and wakes the user's notification streams
+    from .notification_utils import reset_unread_notification_counts
+    reset_unread_notification_counts(instance.user_id)
+
+@receiver(post_save, sender=ChatMessage)
+def chat_message_changed(sender, instance, created, **kwargs):
+    # New and read messages change the other participants' unread counts
+    participant_ids = list(instance.chat_room.participants.exclude(id=instance.sender_id).values_list('id', flat=True))
+    if created:
+        from .read_receipts import count_new_message
+        count_new_message(instance)
+
+        from .activity_feed import display_name, record_activities
+        record_activities([
+            (user_id, 'message', f'New message from {display_name(instance.sender)}', f'/users/chat/{instance.chat_room_id}/')
+            for user_id in participant_ids
+        ])
+    _invalidate_dashboard(*participant_ids)
+
+    # Wakes the room's open event streams
+    from .chat_stream import notify_chat_room
+    notify_chat_room(instance.chat_room_id)
@@ -0,0 +1,75 @@
+# users/notification_stream.py
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .event_stream import STREAM_HEARTBEAT_SECONDS, get_channel_versions, sse_event, wait_for_change
+from .notification_utils import BROADCAST_CHANNEL, get_unread_notification_count, notification_channel
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A stream is closed after this long and the browser reconnects with Last-Event-ID
+NOTIFICATION_STREAM_MAX_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+
+# Most notifications sent per wake-up - older ones are left to the notifications page
+NOTIFICATION_STREAM_BATCH = 20
+
+
+def notification_payload(notification):
+    """A notification as sent to the browser"""
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'icon': notification.icon,
+        'color': notification.color,
+        'url': notification.url,
+        'is_read': notification.is_read,
+        'created_at': notification.get_time_display(),
+    }
+
+
+def _latest_notification_id(user):
+    from .models import Notification
+    return Notification.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _new_notifications(user, last_id):
+    """The user's notifications after last_id, oldest first"""
+    from .models import Notification
+
+    latest = list(Notification.objects.filter(user=user, id__gt=last_id).order_by('-id')[:NOTIFICATION_STREAM_BATCH])
+    return [notification_payload(notification) for notification in reversed(latest)]
+
+
+async def notification_event_stream(user, last_id=None):
+    """Server-Sent Events for a user - 'notification' per new notification and 'unread' when the unread count changes.
+    Without last_id the stream starts at the newest notification, which the page already shows"""
+    deadline = time.monotonic() + NOTIFICATION_STREAM_MAX_SECONDS
+    # The user's own channel, and the one shared by notifications sent to many users at once
+    channels = (notification_channel(user.id), BROADCAST_CHANNEL)
+    if last_id is None:
+        last_id = await sync_to_async(_latest_notification_id)(user)
+    unread = None
+    version = None
+
+    yield 'retry: 3000\n\n'
+    while True:
+        current = await sync_to_async(get_channel_versions)(channels)
+        # An idle user is not queried at all until a channel version changes
+        if current != version:
+            version = current
+            for payload in await sync_to_async(_new_notifications)(user, last_id):
+                last_id = payload['id']
+                yield sse_event('notification', payload, event_id=last_id)
+
+            count = await sync_to_async(get_unread_notification_count)(user)
+            if count != unread:
+                unread = count
+                yield sse_event('unread', {'total_count': unread})
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not await wait_for_change(channels, version, min(remaining, STREAM_HEARTBEAT_SECONDS)):
+            yield ': keep-alive\n\n'
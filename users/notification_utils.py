@@ -1,11 +1,52 @@
 # users/notification_utils.py
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
+from itertools import islice
+from .event_stream import notify_channels
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT when notifying many users at once
+NOTIFICATION_BATCH_SIZE = 1000
+
+# Unread counts are cached per user and dropped whenever a notification is created, read or
+# deleted - the next read recounts once. The short timeout bounds a count cached by a read
+# that raced with a change
+UNREAD_NOTIFICATIONS_TIMEOUT = 60
+
+def unread_notifications_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+def notification_channel(user_id):
+    """Event stream channel of a user's notifications"""
+    return f'notifications:{user_id}'
+
+# Event stream channel every notification stream also watches
+BROADCAST_CHANNEL = 'notifications:broadcast'
+
+def reset_unread_notification_counts(*user_ids, broadcast=False):
+    """Drop the cached counts and dashboards, to be reloaded on the next read, and wake the users' streams -
+    with broadcast, through the one channel every stream watches instead of a version key per user.
+    Deferred until the transaction commits, so neither sees the data from before the change"""
+    from .dashboard import dashboard_cache_key
+    user_ids = set(user_ids)
+
+    def reset():
+        cache.delete_many(
+            [unread_notifications_key(user_id) for user_id in user_ids] +
+            [dashboard_cache_key(user_id) for user_id in user_ids]
+        )
+        if broadcast:
+            notify_channels(BROADCAST_CHANNEL)
+        else:
+            notify_channels(*[notification_channel(user_id) for user_id in user_ids])
+
+    transaction.on_commit(reset)
+
 def create_notification(user, notification_type, title, message, icon='fa-bell', color='primary', url=''):
     """Create a new notification for a user"""
     try:
@@ -27,6 +68,53 @@ def create_notification(user, notification_type, title, message, icon='fa-bell',
         logger.error(f"Error creating notification for {user.username}: {e}")
         return None
 
+def create_notifications(notifications, batch_size=NOTIFICATION_BATCH_SIZE):
+    """Create many notifications in chunked INSERTs - each item takes create_notification's keyword arguments"""
+    try:
+        from django.apps import apps
+        Notification = apps.get_model('users', 'Notification')
+        
+        created = Notification.objects.bulk_create([Notification(**data) for data in notifications], batch_size=batch_size)
+
+        # bulk_create sends no post_save, so drop the cached counts and dashboards here
+        reset_unread_notification_counts(*[notification.user_id for notification in created])
+        logger.info(f"Created {len(created)} notifications in bulk")
+        return created
+    except Exception as e:
+        logger.error(f"Error creating notifications in bulk: {e}")
+        return []
+
+def notify_users(user_ids, notification_type, title, message, icon='fa-bell', color='primary', url='', batch_size=NOTIFICATION_BATCH_SIZE):
+    """Send the same notification to every user id - user_ids may be any iterable and is consumed a chunk at a time.
+    Returns the number of notifications created"""
+    from django.apps import apps
+    Notification = apps.get_model('users', 'Notification')
+
+    user_ids = iter(user_ids)
+    total = 0
+    while True:
+        chunk = list(islice(user_ids, batch_size))
+        if not chunk:
+            break
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                icon=icon,
+                color=color,
+                url=url,
+            )
+            for user_id in chunk
+        ])
+        # bulk_create sends no post_save, so drop the cached counts and dashboards here
+        reset_unread_notification_counts(*chunk, broadcast=True)
+        total += len(chunk)
+
+    logger.info(f"Sent notification \"{title}\" to {total} users")
+    return total
+
 def notify_new_message(receiver, sender, product=None):
     """Notify user about new message"""
     try:
@@ -219,6 +307,7 @@ def mark_all_notifications_read(user):
         Notification = apps.get_model('users', 'Notification')
         
         updated_count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        reset_unread_notification_counts(user.id)
         logger.info(f"Marked {updated_count} notifications as read for {user.username}")
         return True
     except Exception as e:
@@ -226,12 +315,16 @@ def mark_all_notifications_read(user):
         return False
 
 def get_unread_notification_count(user):
-    """Get count of unread notifications for user"""
+    """Get count of unread notifications for user - from the cache, counted only on a miss"""
     try:
         from django.apps import apps
         Notification = apps.get_model('users', 'Notification')
         
-        count = Notification.objects.filter(user=user, is_read=False).count()
+        key = unread_notifications_key(user.id)
+        count = cache.get(key)
+        if count is None:
+            count = Notification.objects.filter(user=user, is_read=False).count()
+            cache.add(key, count, UNREAD_NOTIFICATIONS_TIMEOUT)
         return count
     except Exception as e:
         logger.error(f"Error getting notification count for {user.username}: {e}")
@@ -274,6 +367,8 @@ def bulk_mark_notifications_read(user, notification_ids):
             id__in=notification_ids,
             is_read=False
         ).update(is_read=True)
+        if updated_count:
+            reset_unread_notification_counts(user.id)
         logger.info(f"Marked {updated_count} specific notifications as read for {user.username}")
         return True
     except Exception as e:
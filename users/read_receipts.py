@@ -0,0 +1,77 @@
+# users/read_receipts.py
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import ChatMessage, ChatParticipant, Profile
+from .dashboard import invalidate_dashboard
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def count_new_message(message):
+    """Add a new message to the other participants' unread counters and totals - two UPDATEs"""
+    with transaction.atomic():
+        recipients = ChatParticipant.objects.filter(chat_room_id=message.chat_room_id).exclude(user_id=message.sender_id)
+        recipients.update(unread_count=F('unread_count') + 1)
+        Profile.objects.filter(user_id__in=recipients.values('user_id')).update(
+            unread_messages_total=F('unread_messages_total') + 1
+        )
+
+
+def mark_chat_read(chat_room_id, user, up_to_id=None):
+    """Mark the other participants' messages read up to up_to_id (default: all) with one UPDATE - returns the number marked"""
+    if up_to_id is None:
+        up_to_id = ChatMessage.objects.filter(chat_room_id=chat_room_id).aggregate(last=Max('id'))['last']
+    if not up_to_id:
+        return 0
+
+    now = timezone.now()
+    cleared = 0
+    with transaction.atomic():
+        marked = ChatMessage.objects.filter(
+            chat_room_id=chat_room_id, id__lte=up_to_id, is_read=False
+        ).exclude(sender=user).update(is_read=True, status='read', read_at=now)
+
+        membership = ChatParticipant.objects.select_for_update().filter(chat_room_id=chat_room_id, user=user).first()
+        # The watermark only moves forward
+        if membership and up_to_id > membership.last_read_message_id:
+            # Messages of the others past the new watermark stay unread
+            unread = ChatMessage.objects.filter(chat_room_id=chat_room_id, id__gt=up_to_id).exclude(sender=user).count()
+            cleared = membership.unread_count - unread
+            ChatParticipant.objects.filter(pk=membership.pk).update(
+                unread_count=unread, last_read_message_id=up_to_id, last_read_at=now
+            )
+            if cleared:
+                Profile.objects.filter(user=user).update(
+                    unread_messages_total=Greatest(F('unread_messages_total') - cleared, 0)
+                )
+
+    # update() sends no post_save, so drop the cached unread count here
+    if marked or cleared:
+        invalidate_dashboard(user.id)
+    return marked
+
+
+def refresh_unread_counts(user_ids=None):
+    """Recompute unread counters from the read watermarks, and the users' totals from the counters"""
+    memberships = ChatParticipant.objects.all()
+    profiles = Profile.objects.all()
+    if user_ids is not None:
+        memberships = memberships.filter(user_id__in=user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    unread = ChatMessage.objects.filter(
+        chat_room=OuterRef('chat_room'), id__gt=OuterRef('last_read_message_id')
+    ).exclude(sender=OuterRef('user')).order_by().values('chat_room').annotate(count=Count('id')).values('count')
+    with transaction.atomic():
+        memberships.update(unread_count=Coalesce(Subquery(unread), 0))
+
+        total = ChatParticipant.objects.filter(
+            user=OuterRef('user')
+        ).order_by().values('user').annotate(total=Sum('unread_count')).values('total')
+        updated = profiles.update(unread_messages_total=Coalesce(Subquery(total), 0))
+
+    logger.info(f"Refreshed unread message counts for {updated} users")
+    return updated
@@ -1,3 +1,176 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from products.models import Category, Product
+from .chat_history import decode_message_cursor, encode_message_cursor, get_message_page
+from .cursors import encode_cursor
+from .models import ChatMessage, ChatParticipant, ChatRoom, Profile
+from .read_receipts import mark_chat_read, refresh_unread_counts
 
-# Create your tests here.
+
+class DirectChatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        category = Category.objects.create(category_name='Electronics')
+        cls.phone = Product.objects.create(
+            name='Phone', price=100, description='d', stock=10, category=category, seller=cls.seller,
+            approval_status='approved', status=True, admin_approved=True,
+        )
+
+    def test_one_room_per_pair_whoever_starts_it(self):
+        room, created = ChatRoom.get_or_create_direct(self.buyer, self.seller)
+        same, created_again = ChatRoom.get_or_create_direct(self.seller, self.buyer)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(same, room)
+        self.assertEqual(ChatRoom.objects.count(), 1)
+        self.assertEqual(set(room.participants.all()), {self.buyer, self.seller})
+
+    def test_product_chats_are_separate_rooms(self):
+        general, _ = ChatRoom.get_or_create_direct(self.buyer, self.seller)
+        about_phone, created = ChatRoom.get_or_create_direct(self.buyer, self.seller, product=self.phone)
+        again, created_again = ChatRoom.get_or_create_direct(self.seller, self.buyer, product=self.phone)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertNotEqual(about_phone, general)
+        self.assertEqual(again, about_phone)
+        self.assertEqual(ChatParticipant.objects.filter(chat_room=about_phone).count(), 2)
+
+    def test_start_chat_view_reuses_the_room(self):
+        self.client.force_login(self.buyer)
+
+        first = self.client.get(reverse('start_chat_with_user', args=[self.seller.username]))
+        second = self.client.get(reverse('start_chat_with_user', args=[self.seller.username]))
+
+        room = ChatRoom.objects.get()
+        self.assertRedirects(first, reverse('chat_detail', args=[room.id]), fetch_redirect_response=False)
+        self.assertEqual(second.url, first.url)
+
+
+class ChatHistoryPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        cls.room, _ = ChatRoom.get_or_create_direct(cls.buyer, cls.seller)
+
+    def send(self, count):
+        for n in range(count):
+            ChatMessage.objects.create(chat_room=self.room, sender=self.seller, message=f'message {n}')
+        return list(ChatMessage.objects.filter(chat_room=self.room).order_by('id'))
+
+    def walk(self, limit):
+        """Every page from the latest back, as lists of ids"""
+        pages, position = [], None
+        while True:
+            page, older = get_message_page(self.room.id, position, limit)
+            pages.append([msg.id for msg in page])
+            if not older:
+                return pages
+            position = decode_message_cursor(older)
+
+    def test_a_full_last_page_has_no_cursor(self):
+        messages = self.send(4)
+
+        page, older = get_message_page(self.room.id, limit=4)
+
+        self.assertEqual([msg.id for msg in page], [msg.id for msg in messages])
+        self.assertIsNone(older)
+
+    def test_pages_cover_every_message_once(self):
+        messages = self.send(7)
+
+        pages = self.walk(limit=3)
+
+        self.assertEqual(pages, [[m.id for m in messages[4:]], [m.id for m in messages[1:4]], [messages[0].id]])
+
+    def test_messages_with_the_same_timestamp_are_split_by_id(self):
+        messages = self.send(5)
+        ChatMessage.objects.filter(chat_room=self.room).update(timestamp=timezone.now())
+
+        pages = self.walk(limit=2)
+
+        self.assertEqual(sum(pages[::-1], []), [msg.id for msg in messages])
+
+    def test_cursor_round_trip_and_malformed_cursors(self):
+        message = self.send(1)[0]
+
+        self.assertEqual(decode_message_cursor(encode_message_cursor(message)), (message.timestamp, message.id))
+        for cursor in ['', 'not-base64!', encode_cursor('yesterday', 1), encode_cursor(message.timestamp.isoformat(), 'x')]:
+            self.assertIsNone(decode_message_cursor(cursor))
+
+    def test_history_view_rejects_a_bad_cursor(self):
+        messages = self.send(3)
+        self.client.force_login(self.buyer)
+        url = reverse('chat_history', args=[self.room.id])
+
+        self.assertEqual(self.client.get(url, {'before': 'garbage'}).status_code, 400)
+        response = self.client.get(url, {'before': encode_message_cursor(messages[-1])})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['next_cursor'])
+
+
+class ReadReceiptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+        cls.room, _ = ChatRoom.get_or_create_direct(cls.buyer, cls.seller)
+
+    def send(self, sender, count):
+        return [ChatMessage.objects.create(chat_room=self.room, sender=sender, message=f'message {n}') for n in range(count)]
+
+    def unread(self, user):
+        """(unread count in the room, unread total on the profile)"""
+        return self.room.get_unread_count_for_user(user), Profile.objects.get(user=user).unread_messages_total
+
+    def test_new_messages_count_for_the_other_participant_only(self):
+        self.send(self.seller, 3)
+        self.send(self.buyer, 1)
+
+        self.assertEqual(self.unread(self.buyer), (3, 3))
+        self.assertEqual(self.unread(self.seller), (1, 1))
+
+    def test_reading_up_to_a_message_leaves_later_ones_unread(self):
+        messages = self.send(self.seller, 3)
+
+        self.assertEqual(mark_chat_read(self.room.id, self.buyer, up_to_id=messages[1].id), 2)
+
+        self.assertEqual(self.unread(self.buyer), (1, 1))
+        statuses = list(ChatMessage.objects.filter(chat_room=self.room).order_by('id').values_list('is_read', 'status'))
+        self.assertEqual(statuses, [(True, 'read'), (True, 'read'), (False, 'sent')])
+        membership = ChatParticipant.objects.get(chat_room=self.room, user=self.buyer)
+        self.assertEqual(membership.last_read_message_id, messages[1].id)
+        self.assertIsNotNone(membership.last_read_at)
+
+    def test_the_watermark_only_moves_forward(self):
+        messages = self.send(self.seller, 3)
+        mark_chat_read(self.room.id, self.buyer, up_to_id=messages[1].id)
+
+        self.assertEqual(mark_chat_read(self.room.id, self.buyer, up_to_id=messages[0].id), 0)
+        self.assertEqual(self.unread(self.buyer), (1, 1))
+
+        self.assertEqual(mark_chat_read(self.room.id, self.buyer), 1)
+        self.assertEqual(self.unread(self.buyer), (0, 0))
+
+    def test_own_messages_are_not_marked_read(self):
+        mine = self.send(self.buyer, 2)
+
+        self.assertEqual(mark_chat_read(self.room.id, self.buyer), 0)
+        self.assertFalse(ChatMessage.objects.filter(pk__in=[msg.pk for msg in mine], is_read=True).exists())
+        self.assertEqual(self.unread(self.seller), (2, 2))
+
+    def test_counters_match_a_recount(self):
+        messages = self.send(self.seller, 4)
+        self.send(self.buyer, 2)
+        mark_chat_read(self.room.id, self.buyer, up_to_id=messages[2].id)
+        counters = [self.unread(self.buyer), self.unread(self.seller)]
+
+        refresh_unread_counts()
+
+        self.assertEqual([self.unread(self.buyer), self.unread(self.seller)], counters)
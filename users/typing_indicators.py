@@ -0,0 +1,35 @@
+# users/typing_indicators.py
+from django.core.cache import cache
+from .chat_stream import notify_chat_room
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Typing state only lives in the cache - an indicator disappears this long after it was set
+TYPING_TIMEOUT_SECONDS = 10
+
+
+def typing_key(room_id, user_id):
+    return f'chat:typing:{room_id}:{user_id}'
+
+
+def set_typing(room_id, user):
+    """Mark the user as typing in the room - streams are only woken when the state changes"""
+    key = typing_key(room_id, user.id)
+    payload = {'username': user.username, 'full_name': user.get_full_name() or user.username}
+    if cache.add(key, payload, TYPING_TIMEOUT_SECONDS):
+        notify_chat_room(room_id)
+    else:
+        cache.touch(key, TYPING_TIMEOUT_SECONDS)
+
+
+def clear_typing(room_id, user_id):
+    if cache.delete(typing_key(room_id, user_id)):
+        notify_chat_room(room_id)
+
+
+def get_typing_users(room_id, user_ids):
+    """Users among user_ids currently typing in the room, in user id order"""
+    keys = {typing_key(room_id, user_id): user_id for user_id in user_ids}
+    typing = cache.get_many(keys)
+    return [typing[key] for key in sorted(typing, key=keys.get)]
@@ -9,12 +9,14 @@ urlpatterns = [
     
     # Dashboard and Profile URLs
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('activity/', views.activity_feed, name='activity_feed'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
     path('change-password/', views.change_password, name='change_password'),
     
     # Seller URLs
     path('become-seller/', views.become_seller, name='become_seller'),
     path('my-selling-items/', views.my_selling_items, name='my_selling_items'),
+    path('seller/analytics/data/', views.seller_analytics_data, name='seller_analytics_data'),
     path('add-product/', views.add_product, name='add_product'),
     
     # Orders URLs
@@ -36,11 +38,14 @@ urlpatterns = [
     
     # Chat URLs
     path('chat/', views.chat_list, name='chat_list'),
+    path('chat/search/', views.chat_search, name='chat_search'),
     path('chat/<int:chat_id>/', views.chat_detail, name='chat_detail'),
     path('chat/user/<str:username>/', views.start_chat_with_user, name='start_chat_with_user'),
     path('chat/product/<int:product_id>/', views.start_chat_about_product, name='start_chat_about_product'),
     path('chat/send-message/', views.send_message, name='send_message'),
     path('chat/get-messages/<int:chat_id>/', views.get_new_messages, name='get_new_messages'),
+    path('chat/<int:chat_id>/stream/', views.chat_stream, name='chat_stream'),
+    path('chat/<int:chat_id>/history/', views.chat_history, name='chat_history'),
 
     # Typing indicator URLs
     path('chat/<int:chat_id>/typing/set/', views.set_typing, name='set_typing'),
@@ -52,6 +57,7 @@ urlpatterns = [
     path('notifications/mark-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('notifications/ajax/', views.get_notifications_ajax, name='get_notifications_ajax'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('clear-notifications-only/', views.clear_notifications_only, name='clear_notifications_only'),
     path('clear-django-messages-only/', views.clear_django_messages_only, name='clear_django_messages_only'),
     
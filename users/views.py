@@ -1,36 +1,58 @@
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from .models import Profile, Notification
-from orders.models import Order
+from orders.models import Order, effective_status_expression
 from django.utils import timezone
-from products.models import Product, Category, CategoryVariation, VariationType, VariationOption, ProductVariation
+from products.models import Product, Category, CategoryVariation, VariationType, VariationOption, ProductVariation, SellerDailyStats
+from products.view_counter import record_product_view
+from products.clickstream import capture_event
 import json
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Count, Q
+from django.db.models import Case, Count, F, FloatField, OuterRef, Prefetch, Q, Subquery, Value, When
 from datetime import datetime, timedelta
 from orders.models import OrderItem
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import ChatRoom, ChatMessage
+from .models import ChatRoom, ChatMessage, ChatParticipant
 from orders.views import send_order_confirmation_email
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from .models import TypingIndicator
-from .notification_utils import get_recent_notifications, get_unread_notification_count, create_notification
+from . import typing_indicators
+from .notification_utils import get_recent_notifications, get_unread_notification_count, create_notification, notify_users, reset_unread_notification_counts
+from .dashboard import get_dashboard_data
+from .activity_feed import get_activity_page
+from .chat_stream import chat_event_stream, message_payload
+from .notification_stream import notification_event_stream, notification_payload
+from .read_receipts import mark_chat_read
+from .chat_history import decode_message_cursor, get_message_page
+from .chat_search import decode_search_cursor, search_messages
 from .models import Wishlist
 from products.models import Product
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
 from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
 import os
 from orders.views import send_order_shipped_email, send_order_delivered_email
 from functools import wraps
 from django.core.exceptions import PermissionDenied
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status tabs on the seller received orders page
+SELLER_ORDER_STATUS_TABS = ['pending', 'processing', 'shipped', 'delivered', 'completed']
+
+# Day windows served by the seller analytics endpoint
+SELLER_ANALYTICS_WINDOWS = [7, 30, 90]
 
 # ========== PERMISSION DECORATORS ==========
 
@@ -501,7 +523,7 @@ def received_orders(request):
 
 @login_required
 def seller_received_orders(request):
-    """Display orders received by seller from customers - FIXED"""
+    """Display orders received by seller from customers - paginated, counts done in SQL"""
     profile = request.user.profile
 
     # Gate: Only approved sellers can access
@@ -509,43 +531,50 @@ def seller_received_orders(request):
         messages.error(request, 'You need to be an approved seller to access this page.')
         return redirect('dashboard')
 
-    # Get ORDER ITEMS where this user is the seller
+    # Status counts over unique orders - one GROUP BY instead of loading every item
+    seller_order_ids = OrderItem.objects.filter(
+        seller=request.user,
+        ordered=True
+    ).values('order_id')
+
+    status_counts = {
+        row['effective_status']: row['count']
+        for row in Order.objects.filter(id__in=seller_order_ids)
+        .annotate(effective_status=effective_status_expression())
+        .values('effective_status')
+        .annotate(count=Count('id'))
+        .order_by()
+    }
+
+    # Get ORDER ITEMS where this user is the seller, filtered by status tab
     seller_received_orders = OrderItem.objects.filter(
         seller=request.user,
         ordered=True
-    ).select_related('order', 'product', 'order__user').order_by('-order__created_at')
-
-    # Calculate status counts - use actual database fields
-    all_orders = [item.order for item in seller_received_orders]
-    unique_orders = list(set(all_orders))  # Remove duplicates
-    
-    # Count by checking the actual status of unique orders
-    pending_orders_count = 0
-    processing_orders_count = 0
-    shipped_orders_count = 0
-    delivered_orders_count = 0
-    completed_orders_count = 0
-    
-    for order in unique_orders:
-        status = order.get_effective_status()
-        if status == 'pending':
-            pending_orders_count += 1
-        elif status == 'processing':
-            processing_orders_count += 1
-        elif status == 'shipped':
-            shipped_orders_count += 1
-        elif status == 'delivered':
-            delivered_orders_count += 1
-        elif status == 'completed':
-            completed_orders_count += 1
+    ).select_related('order', 'product', 'order__user').prefetch_related(
+        'variations__variation_type',
+        'variations__variation_option'
+    ).order_by('-order__created_at', '-id')
+
+    current_status = request.GET.get('status', 'all')
+    if current_status in SELLER_ORDER_STATUS_TABS:
+        seller_received_orders = seller_received_orders.annotate(
+            effective_status=effective_status_expression('order__')
+        ).filter(effective_status=current_status)
+    else:
+        current_status = 'all'
+
+    paginator = Paginator(seller_received_orders, 20)
+    paged_orders = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'received_orders': seller_received_orders,
-        'pending_orders_count': pending_orders_count,
-        'processing_orders_count': processing_orders_count,
-        'shipped_orders_count': shipped_orders_count,
-        'delivered_orders_count': delivered_orders_count,
-        'completed_orders_count': completed_orders_count,
+        'received_orders': paged_orders,
+        'current_status': current_status,
+        'total_orders_count': sum(status_counts.values()),
+        'pending_orders_count': status_counts.get('pending', 0),
+        'processing_orders_count': status_counts.get('processing', 0),
+        'shipped_orders_count': status_counts.get('shipped', 0),
+        'delivered_orders_count': status_counts.get('delivered', 0),
+        'completed_orders_count': status_counts.get('completed', 0),
         'today': timezone.now(),
     }
     return render(request, 'users/seller_received_orders.html', context)
@@ -656,7 +685,7 @@ def logout_view(request):
 
 @login_required
 def my_selling_items(request):
-    """Display seller's products with FIXED analytics - NO VIEW INFLATION"""
+    """Display seller's products with read-only analytics - NO VIEW INFLATION"""
     profile = request.user.profile
 
     # Gate: Only approved sellers can access
@@ -664,24 +693,85 @@ def my_selling_items(request):
         messages.error(request, 'You need to be an approved seller to access this page.')
         return redirect('dashboard')
 
-    # Get seller's products with analytics - NO VIEW INCREMENT!
-    products = Product.objects.filter(seller=request.user).order_by('-created_at')
-    
-    for product in products:
-        if product.approval_status == 'approved':
-            # Get fresh analytics data WITHOUT incrementing views
-            analytics = product.get_analytics_data()
-            product.analytics = analytics
+    products = Product.objects.filter(seller=request.user)
+
+    # Approval counts in one conditional aggregate
+    counts = products.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(approval_status='pending')),
+        approved=Count('id', filter=Q(approval_status='approved')),
+        rejected=Count('id', filter=Q(approval_status='rejected')),
+    )
+
+    # Analytics come from the stored, ledger-derived counters - this page never writes
+    products = products.annotate(
+        conversion_rate=Case(
+            When(view_count__gt=0, then=F('order_count') * 100.0 / F('view_count')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by('-created_at')
+
+    paginator = Paginator(products, 20)
+    paged_products = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'products': products,
-        'total_products': products.count(),
-        'pending_products': products.filter(approval_status='pending').count(),
-        'approved_products': products.filter(approval_status='approved').count(),
-        'rejected_products': products.filter(approval_status='rejected').count(),
+        'products': paged_products,
+        'total_products': counts['total'],
+        'pending_products': counts['pending'],
+        'approved_products': counts['approved'],
+        'rejected_products': counts['rejected'],
     }
     return render(request, 'users/my_selling_items.html', context)
 
+@login_required
+def seller_analytics_data(request):
+    """Daily analytics series for the seller over the last 7/30/90 days, served from the rollups (JSON)"""
+    if request.user.profile.seller_status != 'approved':
+        return JsonResponse({'success': False, 'error': 'Only approved sellers can view analytics'}, status=403)
+
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 0
+    if days not in SELLER_ANALYTICS_WINDOWS:
+        return JsonResponse({'success': False, 'error': f'days must be one of {SELLER_ANALYTICS_WINDOWS}'}, status=400)
+
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    fields = ['views', 'add_to_carts', 'orders', 'units', 'revenue']
+    rows = {
+        row['date']: row
+        for row in SellerDailyStats.objects.filter(
+            seller=request.user, date__gte=start, date__lte=end
+        ).values('date', *fields)
+    }
+
+    # Days without activity have no row - fill them with zeros
+    series = []
+    totals = dict.fromkeys(fields, 0)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day, {})
+        point = {'date': day.isoformat()}
+        for field in fields:
+            value = row.get(field) or 0
+            point[field] = float(value) if field == 'revenue' else value
+            totals[field] += point[field]
+        series.append(point)
+
+    totals['revenue'] = round(totals['revenue'], 2)
+    totals['conversion_rate'] = round(totals['orders'] / totals['views'] * 100, 2) if totals['views'] else 0
+
+    return JsonResponse({
+        'success': True,
+        'days': days,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series,
+        'totals': totals,
+    })
+
 @login_required
 def become_seller(request):
     """Apply to become a seller with QR code upload"""
@@ -972,99 +1062,52 @@ def get_add_product_context():
     }
 
 
-def revert_analytics_after_rejection(order):
-    """Revert product analytics when order payment is rejected"""
-    try:
-        print(f" REVERTING ANALYTICS for order #{order.order_number}")
-        
-        # Get all order items
-        from orders.models import OrderItem
-        order_items = OrderItem.objects.filter(order=order, ordered=True)
-        
-        reverted_products = []
-        total_reverted_revenue = 0
-        
-        for item in order_items:
-            product = item.product
-            
-            # Revert order count
-            if hasattr(product, 'order_count') and product.order_count > 0:
-                old_count = product.order_count
-                product.order_count = max(0, product.order_count - item.quantity)
-                print(f" {product.name}: order_count {old_count} → {product.order_count}")
-            
-            # Revert total revenue
-            if hasattr(product, 'total_revenue') and product.total_revenue > 0:
-                item_revenue = item.quantity * item.price
-                old_revenue = float(product.total_revenue)
-                product.total_revenue = max(0, old_revenue - item_revenue)
-                total_reverted_revenue += item_revenue
-                print(f" {product.name}: revenue {old_revenue} → {product.total_revenue} (reverted Rs.{item_revenue})")
-            
-            # Save the product
-            product.save(update_fields=['order_count', 'total_revenue'])
-            reverted_products.append(product.name)
-        
-        print(f" Analytics reverted for {len(reverted_products)} products. Total revenue reverted: Rs.{total_reverted_revenue}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error reverting analytics: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-
 # CHAT SYSTEM
 
 @login_required
 def chat_list(request):
     """Display all chat rooms for current user with last messages - Enhanced"""
     try:
-        # Clear any stale typing indicators first
-        from datetime import timedelta
-        cutoff_time = timezone.now() - timedelta(minutes=5)
-        TypingIndicator.objects.filter(created_at__lt=cutoff_time).delete()
-        
-        # Get chat rooms with proper error handling
+        # Last message and unread count come from subqueries, so no message rows are loaded
+        last_message = ChatMessage.objects.filter(chat_room=OuterRef('pk')).order_by('-timestamp', '-id')
+        membership = ChatParticipant.objects.filter(chat_room=OuterRef('pk'), user=request.user)
         chat_rooms = ChatRoom.objects.filter(
             participants=request.user,
             is_active=True  # Only show active chats
-        ).prefetch_related(
-            'participants', 
-            'messages__sender',
-            'product'
+        ).annotate(
+            last_message_text=Subquery(last_message.values('message')[:1]),
+            last_message_sender_id=Subquery(last_message.values('sender_id')[:1]),
+            last_message_at=Subquery(last_message.values('timestamp')[:1]),
+            unread_count=Subquery(membership.values('unread_count')[:1]),
+        ).select_related('product').prefetch_related(
+            Prefetch('participants', queryset=User.objects.select_related('profile'))
         ).order_by('-updated_at')
-        
-        #  unread count and last message for each chat
+
+        paginator = Paginator(chat_rooms, 20)
+        paged_chats = paginator.get_page(request.GET.get('page'))
+
         chat_data = []
-        for chat in chat_rooms:
-            try:
-                other_participant = chat.get_other_participant(request.user)
-                
-                # Skip chats where we can't find the other participant
-                if not other_participant:
-                    continue
-                    
-                unread_count = ChatMessage.objects.filter(
-                    chat_room=chat,
-                    is_read=False
-                ).exclude(sender=request.user).count()
-                
-                last_message = chat.get_last_message()
-                
-                chat_data.append({
-                    'chat': chat,
-                    'other_participant': other_participant,
-                    'unread_count': unread_count,
-                    'last_message': last_message,
-                })
-            except Exception as e:
-                print(f"Error processing chat {chat.id}: {e}")
+        for chat in paged_chats:
+            other_participant = chat.get_other_participant(request.user)
+
+            # Skip chats where we can't find the other participant
+            if not other_participant:
                 continue
-        
+
+            chat_data.append({
+                'chat': chat,
+                'other_participant': other_participant,
+                'unread_count': chat.unread_count,
+                'last_message': {
+                    'message': chat.last_message_text,
+                    'sender_id': chat.last_message_sender_id,
+                    'timestamp': chat.last_message_at,
+                } if chat.last_message_at else None,
+            })
+
         context = {
             'chat_data': chat_data,
+            'chats': paged_chats,
         }
         return render(request, 'users/chat_list.html', context)
         
@@ -1085,26 +1128,52 @@ def chat_detail(request, chat_id):
         return redirect('chat_list')
     
     # Mark messages as read when user views chat
-    unread_messages = ChatMessage.objects.filter(
-        chat_room=chat_room,
-        is_read=False
-    ).exclude(sender=request.user)
-    
-    for msg in unread_messages:
-        msg.mark_as_read(by_user=request.user)
+    mark_chat_read(chat_room.id, request.user)
     
     # Update user's last seen
     request.user.profile.update_last_seen()
     
-    messages_list = chat_room.messages.select_related('sender').order_by('timestamp')
+    # Only the latest page - older messages are loaded on demand through chat_history
+    messages_list, older_cursor = get_message_page(chat_room.id)
     
     context = {
         'chat_room': chat_room,
         'messages': messages_list,
+        'older_cursor': older_cursor,
         'other_participant': other_participant,
+        # Streaming needs an ASGI server - under WSGI the page keeps polling
+        'chat_stream': settings.CHAT_STREAM_ENABLED and isinstance(request, ASGIRequest),
     }
     return render(request, 'users/chat_detail.html', context)
 
+@login_required
+def chat_history(request, chat_id):
+    """A page of messages older than the ?before= cursor, rendered like the chat page"""
+    chat_room = get_object_or_404(ChatRoom, id=chat_id, participants=request.user)
+    cursor = decode_message_cursor(request.GET.get('before', ''))
+    if not cursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    messages_list, older_cursor = get_message_page(chat_room.id, cursor)
+    return JsonResponse({
+        'success': True,
+        'html': render_to_string('users/includes/chat_messages.html', {'messages': messages_list, 'user': request.user}),
+        'next_cursor': older_cursor,
+    })
+
+@login_required
+def chat_search(request):
+    """Ranked search over the messages of the user's chats - ?q= words, ?cursor= for the next page"""
+    query = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
+    if cursor and not decode_search_cursor(cursor):
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    results, next_cursor = search_messages(request.user, query, cursor)
+    for result in results:
+        result['chat_url'] = reverse('chat_detail', args=[result['chat_id']])
+    return JsonResponse({'success': True, 'results': results, 'next_cursor': next_cursor})
+
 @login_required
 def start_chat_with_user(request, username):
     """Start or continue chat with specific user"""
@@ -1114,20 +1183,10 @@ def start_chat_with_user(request, username):
         messages.error(request, "You cannot chat with yourself!")
         return redirect('chat_list')
     
-    # Check if chat already exists between these two users
-    chat_room = None
-    
-    # Find existing chat room between exactly these two users
-    for room in ChatRoom.objects.filter(participants=request.user):
-        if room.participants.count() == 2 and other_user in room.participants.all():
-            chat_room = room
-            break
+    # One indexed lookup on the pair's key - created if missing
+    chat_room, created = ChatRoom.get_or_create_direct(request.user, other_user)
     
-    if not chat_room:
-        # Create new chat room
-        chat_room = ChatRoom.objects.create()
-        chat_room.participants.add(request.user, other_user)
-        
+    if created:
         #   welcome message
         ChatMessage.objects.create(
             chat_room=chat_room,
@@ -1148,19 +1207,10 @@ def start_chat_about_product(request, product_id):
         messages.error(request, "You cannot chat about your own product!")
         return redirect('products:product_detail', product.category.slug, product.slug)
     
-    # Check if chat already exists for this product between these users
-    chat_room = ChatRoom.objects.filter(
-        participants=request.user,
-        product=product
-    ).filter(
-        participants=seller
-    ).first()
+    # One indexed lookup on the pair's key for this product - created if missing
+    chat_room, created = ChatRoom.get_or_create_direct(request.user, seller, product=product)
     
-    if not chat_room:
-        # Create new product-specific chat
-        chat_room = ChatRoom.objects.create(product=product)
-        chat_room.participants.add(request.user, seller)
-        
+    if created:
         # initial message about the product
         ChatMessage.objects.create(
             chat_room=chat_room,
@@ -1204,10 +1254,7 @@ def send_message(request):
                 chat_room.save()
                 
                 # Clear typing indicator
-                TypingIndicator.objects.filter(
-                    chat_room=chat_room,
-                    user=request.user
-                ).delete()
+                typing_indicators.clear_typing(chat_room.id, request.user.id)
                 
                 return JsonResponse({
                     'success': True,
@@ -1235,11 +1282,7 @@ def set_typing(request, chat_id):
         try:
             chat_room = get_object_or_404(ChatRoom, id=chat_id, participants=request.user)
             
-            # Create or update typing indicator
-            typing_indicator, created = TypingIndicator.objects.get_or_create(
-                chat_room=chat_room,
-                user=request.user
-            )
+            typing_indicators.set_typing(chat_room.id, request.user)
             
             return JsonResponse({'success': True})
         except Exception as e:
@@ -1254,10 +1297,7 @@ def clear_typing(request, chat_id):
         try:
             chat_room = get_object_or_404(ChatRoom, id=chat_id, participants=request.user)
             
-            TypingIndicator.objects.filter(
-                chat_room=chat_room,
-                user=request.user
-            ).delete()
+            typing_indicators.clear_typing(chat_room.id, request.user.id)
             
             return JsonResponse({'success': True})
         except Exception as e:
@@ -1271,24 +1311,9 @@ def get_typing_users(request, chat_id):
     try:
         chat_room = get_object_or_404(ChatRoom, id=chat_id, participants=request.user)
         
-        # Clean up old typing indicators (older than 10 seconds)
-        cutoff_time = timezone.now() - timedelta(seconds=10)
-        TypingIndicator.objects.filter(
-            chat_room=chat_room,
-            created_at__lt=cutoff_time
-        ).delete()
-        
-        # Get current typing users (excluding current user)
-        typing_users = TypingIndicator.objects.filter(
-            chat_room=chat_room
-        ).exclude(user=request.user).select_related('user')
-        
-        users_data = []
-        for indicator in typing_users:
-            users_data.append({
-                'username': indicator.user.username,
-                'full_name': indicator.user.get_full_name() or indicator.user.username
-            })
+        # Typing state expires in the cache by itself
+        other_ids = chat_room.participants.exclude(id=request.user.id).values_list('id', flat=True)
+        users_data = typing_indicators.get_typing_users(chat_room.id, other_ids)
         
         return JsonResponse({
             'success': True,
@@ -1303,32 +1328,44 @@ def get_new_messages(request, chat_id):
     chat_room = get_object_or_404(ChatRoom, id=chat_id, participants=request.user)
     last_message_id = request.GET.get('last_id', 0)
     
-    new_messages = ChatMessage.objects.filter(
+    new_messages = list(ChatMessage.objects.filter(
         chat_room=chat_room,
         id__gt=last_message_id
-    ).exclude(sender=request.user).select_related('sender')
+    ).exclude(sender=request.user).select_related('sender').order_by('id'))
     
     # Mark new messages as read
-    for msg in new_messages:
-        msg.mark_as_read(by_user=request.user)
-    
-    messages_data = []
-    for msg in new_messages:
-        messages_data.append({
-            'id': msg.id,
-            'message': msg.message,
-            'sender': msg.sender.username,
-            'sender_name': msg.sender.get_full_name() or msg.sender.username,
-            'timestamp': msg.get_time_display(),  #  Human-readable time
-            'status_icon': msg.get_status_icon(),  # Status icon
-            'is_mine': False
-        })
+    if new_messages:
+        mark_chat_read(chat_room.id, request.user, up_to_id=new_messages[-1].id)
+        for msg in new_messages:
+            msg.is_read, msg.status = True, 'read'
     
     return JsonResponse({
         'success': True,
-        'messages': messages_data
+        'messages': [message_payload(msg, request.user) for msg in new_messages]
     })
 
+@login_required
+async def chat_stream(request, chat_id):
+    """Server-Sent Events stream of new messages and typing changes - replaces polling when served over ASGI"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': 'Streaming requires an ASGI server'}, status=400)
+
+    user = await request.auser()
+    if not await ChatRoom.objects.filter(id=chat_id, participants=user).aexists():
+        raise Http404('Chat not found')
+
+    # EventSource resends the last delivered id when it reconnects
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id') or 0
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        last_id = 0
+
+    response = StreamingHttpResponse(chat_event_stream(chat_id, user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # PRODUCT MANAGEMENT
 
 @login_required
@@ -2054,6 +2091,7 @@ def clear_messages(request):
         notifications_cleared = 0
         try:
             notifications_cleared = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            reset_unread_notification_counts(request.user.id)
             print(f" Marked {notifications_cleared} notifications as read")
         except Exception as e:
             print(f" Error clearing notifications: {e}")
@@ -2114,6 +2152,7 @@ def mark_all_notifications_read(request):
                 user=request.user, 
                 is_read=False
             ).update(is_read=True, read_at=timezone.now())
+            reset_unread_notification_counts(request.user.id)
             
             return JsonResponse({
                 'success': True, 
@@ -2139,18 +2178,7 @@ def get_notifications_ajax(request):
         notifications = get_recent_notifications(request.user, limit=10)
         total_notifications = get_unread_notification_count(request.user)
         
-        notifications_data = []
-        for notification in notifications:
-            notifications_data.append({
-                'id': notification.id,
-                'title': notification.title,
-                'message': notification.message,
-                'icon': notification.icon,
-                'color': notification.color,
-                'url': notification.url,
-                'is_read': notification.is_read,
-                'created_at': notification.get_time_display(),
-            })
+        notifications_data = [notification_payload(notification) for notification in notifications]
         
         return JsonResponse({
             'notifications': notifications_data,
@@ -2166,12 +2194,33 @@ def get_notifications_ajax(request):
             'error': str(e)
         })
 
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events stream of new notifications and the unread count - replaces polling when served over ASGI"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': 'Streaming requires an ASGI server'}, status=400)
+
+    user = await request.auser()
+
+    # EventSource resends the last delivered id when it reconnects
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+
+    response = StreamingHttpResponse(notification_event_stream(user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @require_POST
 @login_required
 def clear_notifications_only(request):
     """Clear ONLY database notifications"""
     try:
         updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        reset_unread_notification_counts(request.user.id)
         return JsonResponse({
             'status': 'success', 
             'message': f'Cleared {updated_count} notifications',
@@ -2986,37 +3035,31 @@ def bulk_approve_sellers(request):
     
     if request.method == 'POST':
         user_ids = request.POST.getlist('user_ids')
-        approved_count = 0
+        approved_ids = []
         email_success_count = 0
         
-        for user_id in user_ids:
-            try:
-                user = User.objects.get(id=user_id)
-                profile = user.profile
-                
-                if profile.seller_status == 'pending':
-                    profile.seller_status = 'approved'
-                    profile.seller_approved_date = timezone.now()
-                    profile.save()
-                    approved_count += 1
-                    
-                    # Send approval email
-                    if send_user_email(user, 'seller_approval'):
-                        email_success_count += 1
-                    
-                    # Create notification
-                    create_notification(
-                        user=user,
-                        notification_type='system',
-                        title='Seller Application Approved!',
-                        message='Congratulations! Your seller application has been approved. You can now start selling!',
-                        icon='fa-check-circle',
-                        color='success',
-                        url='/dashboard/'
-                    )
-                    
-            except User.DoesNotExist:
-                continue
+        pending = Profile.objects.filter(user_id__in=user_ids, seller_status='pending').select_related('user')
+        for profile in pending:
+            profile.seller_status = 'approved'
+            profile.seller_approved_date = timezone.now()
+            profile.save()
+            approved_ids.append(profile.user_id)
+            
+            # Send approval email
+            if send_user_email(profile.user, 'seller_approval'):
+                email_success_count += 1
+        
+        # One chunked INSERT for every approved seller's notification
+        notify_users(
+            approved_ids,
+            notification_type='system',
+            title='Seller Application Approved!',
+            message='Congratulations! Your seller application has been approved. You can now start selling!',
+            icon='fa-check-circle',
+            color='success',
+            url='/dashboard/'
+        )
+        approved_count = len(approved_ids)
         
         messages.success(request, f' Approved {approved_count} sellers. {email_success_count} email notifications sent.')
     
@@ -3066,197 +3109,53 @@ def track_product_view(request, product):
         # Update session
         request.session[session_key] = current_time
         
-        # Increment view count
-        product.view_count = (product.view_count or 0) + 1
-        product.save(update_fields=['view_count'])
-        
-        print(f" View tracked for {product.name}: {product.view_count}")
+        # Buffer the view - written to the database in batches
+        record_product_view(product.id)
+        capture_event('view', request, product_id=product.id)
         return True
         
     except Exception as e:
         print(f"❌ Error tracking view: {e}")
         return False
 
-def update_order_analytics(order):
-    """
-    Update product analytics when order is CONFIRMED/PAID
-    This should be called ONLY ONCE per order
-    """
-    try:
-        print(f" Updating analytics for order #{order.order_number}")
-        
-        for item in order.items.filter(ordered=True):
-            product = item.product
-            
-            # Update order count
-            old_order_count = product.order_count or 0
-            product.order_count = old_order_count + item.quantity
-            
-            # Update revenue
-            item_revenue = item.quantity * item.price
-            old_revenue = float(product.total_revenue or 0)
-            product.total_revenue = old_revenue + item_revenue
-            
-            product.save(update_fields=['order_count', 'total_revenue'])
-            
-            print(f" {product.name}: orders {old_order_count} → {product.order_count}, revenue +Rs.{item_revenue}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error updating analytics: {e}")
-        return False
-
 @login_required
 def dashboard(request):
-    """Fixed dashboard with accurate analytics"""
+    """Dashboard with accurate analytics, served from a short-lived per-user cache"""
     try:
         profile = request.user.profile
     except Profile.DoesNotExist:
         profile = Profile.objects.create(user=request.user)
 
-    # Calculate orders count
-    orders_count = Order.objects.filter(user=request.user).count()
-    
-    # Calculate received orders count (for sellers)
-    received_orders_count = 0
-    if profile.seller_status == 'approved':
-        received_orders_count = OrderItem.objects.filter(seller=request.user).count()
-
-    # Real unread messages count
-    unread_messages_count = profile.get_unread_messages_count()
-    
-    # Wishlist count
-    wishlist_count = Wishlist.get_wishlist_count(request.user)
-
-    #  pending QR count for sidebar
-    pending_qr_count = 0
-    if profile.seller_status == 'approved':
-        pending_qr_count = Order.objects.filter(
-            items__seller=request.user,
-            payment_method='QR Payment',
-            payment_status='pending_verification'
-        ).distinct().count()
-
-    #  Seller analytics calculation with proper aggregation
-    seller_stats = {}
-    if profile.seller_status == 'approved':
-        seller_products = Product.objects.filter(
-            seller=request.user, 
-            approval_status='approved'
-        )
-        
-        # Aggregate analytics properly
-        from django.db.models import Sum
-        analytics = seller_products.aggregate(
-            total_views=Sum('view_count'),
-            total_orders=Sum('order_count'), 
-            total_revenue=Sum('total_revenue')
-        )
-        
-        total_views = analytics['total_views'] or 0
-        total_orders = analytics['total_orders'] or 0
-        total_revenue = float(analytics['total_revenue'] or 0)
-        
-        seller_stats = {
-            'total_products': seller_products.count(),
-            'total_views': total_views,
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
-            'avg_conversion': (total_orders / total_views * 100) if total_views > 0 else 0,
-        }
-
-    # Generate recent activities 
-    recent_activities = []
-    
-    # Recent orders
-    recent_orders = Order.objects.filter(user=request.user).order_by('-created_at')[:3]
-    for order in recent_orders:
-        recent_activities.append({
-            'message': f'Order #{order.id} placed successfully',
-            'created_at': order.created_at,
-            'icon': 'fa-shopping-cart',
-            'badge_color': 'primary'
-        })
-    
-    # Recent wishlist additions
-    recent_wishlist = Wishlist.objects.filter(user=request.user).order_by('-added_at')[:2]
-    for item in recent_wishlist:
-        recent_activities.append({
-            'message': f'Added "{item.product.name}" to wishlist',
-            'created_at': item.added_at,
-            'icon': 'fa-heart',
-            'badge_color': 'danger'
-        })
-    
-    # Recent chat messages 
-    recent_chat_messages = ChatMessage.objects.filter(
-        chat_room__participants=request.user
-    ).exclude(sender=request.user).order_by('-timestamp')[:2]
-    
-    for msg in recent_chat_messages:
-        recent_activities.append({
-            'message': f'New message from {msg.sender.get_full_name() or msg.sender.username}',
-            'created_at': msg.timestamp,
-            'icon': 'fa-comments',
-            'badge_color': 'info'
-        })
-
-    # Recent seller activities (if seller)
-    if profile.seller_status == 'approved':
-        # Recent products
-        recent_products = Product.objects.filter(seller=request.user).order_by('-created_at')[:2]
-        for product in recent_products:
-            recent_activities.append({
-                'message': f'Product "{product.name}" added for review',
-                'created_at': product.created_at,
-                'icon': 'fa-plus',
-                'badge_color': 'success'
-            })
-        
-        # Recent received orders
-        recent_received = OrderItem.objects.filter(seller=request.user).order_by('-order__created_at')[:2]
-        for item in recent_received:
-            recent_activities.append({
-                'message': f'New order received for "{item.product.name}"',
-                'created_at': item.order.created_at,
-                'icon': 'fa-bell',
-                'badge_color': 'warning'
-            })
-        
-        #  QR payment notifications to recent activities
-        if pending_qr_count > 0:
-            recent_activities.append({
-                'message': f'{pending_qr_count} QR payment(s) awaiting verification',
-                'created_at': timezone.now(),
-                'icon': 'fa-qrcode',
-                'badge_color': 'warning'
-            })
-    
-    # Sort activities by date
-    recent_activities.sort(key=lambda x: x['created_at'], reverse=True)
-    recent_activities = recent_activities[:5]
-
+    # Counts, seller stats, recent activity and notifications - cached per user
+    dashboard_data = get_dashboard_data(request.user, profile)
 
-    notifications = get_recent_notifications(request.user, limit=10)
-    total_notifications = get_unread_notification_count(request.user)
-
-    # Additional stats
     context = {
         'profile': profile,
-        'orders_count': orders_count,
-        'received_orders_count': received_orders_count,
         'user': request.user,
-        'seller_stats': seller_stats,
-        'recent_activities': recent_activities,
-        'wishlist_count': wishlist_count,
-        'unread_messages_count': unread_messages_count, 
-        'pending_qr_count': pending_qr_count,
-        'notifications': notifications,
-        'total_notifications': total_notifications,
+        **dashboard_data,
     }
     return render(request, 'users/dashboard.html', context)
 
+@login_required
+def activity_feed(request):
+    """The user's activity history, newest first, with cursor pagination (JSON)"""
+    activities, next_cursor = get_activity_page(request.user, cursor=request.GET.get('cursor'))
+    return JsonResponse({
+        'success': True,
+        'activities': [
+            {
+                'type': activity.activity_type,
+                'message': activity.message,
+                'icon': activity.icon,
+                'badge_color': activity.badge_color,
+                'url': activity.url,
+                'created_at': activity.created_at.isoformat(),
+            }
+            for activity in activities
+        ],
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 def verify_qr_payments(request):
     """UPDATED QR verification - handles analytics for QR orders ONLY"""
@@ -3267,99 +3166,36 @@ def verify_qr_payments(request):
         messages.error(request, 'You need to be an approved seller to access this page.')
         return redirect('dashboard')
 
-    # Handle verification actions
+    # Handle verification actions - one order or many selected at once
     if request.method == 'POST':
-        order_id = request.POST.get('order_id')
+        order_ids = request.POST.getlist('order_ids') or [request.POST.get('order_id')]
+        order_ids = [int(order_id) for order_id in order_ids if order_id and str(order_id).isdigit()]
         action = request.POST.get('action')
         
         try:
-            order = Order.objects.filter(
-                id=order_id, 
-                items__seller=request.user,
-                payment_method='QR Payment',
-                payment_status='pending_verification'
-            ).distinct().first()
+            from orders.qr_verification import bulk_verify_qr_payments, bulk_reject_qr_payments
             
-            # Check if order exists
-            if not order:
-                messages.error(request, 'Order not found or unauthorized access.')
+            if not order_ids:
+                messages.error(request, 'No orders selected.')
                 return redirect('verify_qr_payments')
             
             if action == 'verify':
-                order.payment_status = 'completed'
-                order.status = 'Confirmed'
-                order.order_status = 'confirmed'
-                order.qr_payment_verified_by = request.user
-                order.qr_payment_verified_at = timezone.now()
-                order.save()
-                
-                print(f" Payment verified - updating analytics for order #{order.order_number}")
-                analytics_updated = update_order_analytics(order)
-                
-                # Send confirmation email
-                from orders.views import send_order_confirmation_email
-                send_order_confirmation_email(order)
-                
-                # Create notification for payment verification
-                create_notification(
-                    user=order.user,
-                    notification_type='order',
-                    title='Payment Verified!',
-                    message=f'Your payment for Order #{order.order_number} has been verified and confirmed.',
-                    icon='fa-check-circle',
-                    color='success',
-                    url='/orders/my-orders/'
-                )
-                
-                message = f' Payment verified for Order #{order.order_number}. Customer notified!'
-                if analytics_updated:
-                    message += ' Analytics updated.'
-                else:
-                    message += ' (Analytics update failed)'
+                orders = bulk_verify_qr_payments(order_ids, verified_by=request.user, seller=request.user)
+                if not orders:
+                    messages.error(request, 'Order not found or unauthorized access.')
+                    return redirect('verify_qr_payments')
                 
-                messages.success(request, message)
+                order_numbers = ', '.join(f'#{order.order_number}' for order in orders)
+                messages.success(request, f' Payment verified for {len(orders)} order(s): {order_numbers}. Customers notified! Analytics updated.')
                 
             elif action == 'reject':
-                print(f"🚫 REJECTING ORDER #{order.order_number}")
-                
-                # Import the functions
-                from orders.views import send_order_rejection_email, revert_stock_after_rejection
-                
-                analytics_reverted = revert_analytics_after_rejection(order)
+                orders = bulk_reject_qr_payments(order_ids, seller=request.user)
+                if not orders:
+                    messages.error(request, 'Order not found or unauthorized access.')
+                    return redirect('verify_qr_payments')
                 
-                # Revert stock
-                stock_reverted = revert_stock_after_rejection(order)
-                
-                # Update order status
-                order.payment_status = 'rejected'
-                order.status = 'Payment Rejected'
-                order.order_status = 'cancelled'
-                order.save()
-                
-                # Send rejection email
-                email_sent = send_order_rejection_email(order)
-                
-                # Create notification for payment rejection
-                create_notification(
-                    user=order.user,
-                    notification_type='order',
-                    title='Payment Rejected',
-                    message=f'Your payment for Order #{order.order_number} could not be verified and has been rejected.',
-                    icon='fa-times-circle',
-                    color='danger',
-                    url='/orders/my-orders/'
-                )
-                
-                # Success message with analytics tracking
-                message = f'❌ Payment rejected for Order #{order.order_number}.'
-                if analytics_reverted:
-                    message += ' Analytics reverted.'
-                if stock_reverted:
-                    message += ' Stock reverted.'
-                if email_sent:
-                    message += ' Customer notified.'
-                
-                messages.warning(request, message)
+                order_numbers = ', '.join(f'#{order.order_number}' for order in orders)
+                messages.warning(request, f'❌ Payment rejected for {len(orders)} order(s): {order_numbers}. Analytics and stock reverted. Customers notified.')
                 
         except Exception as e:
             print(f"❌ Error in verification: {str(e)}")
@@ -3394,28 +3230,9 @@ def verify_qr_payments(request):
 
 def update_order_analytics_for_completed_orders():
     """One-time function to add analytics for existing completed orders that don't have them"""
+    from orders.sales_ledger import backfill_sales_ledger
     
-    # Get all completed orders without analytics
-    completed_orders = Order.objects.filter(
-        payment_status__in=['completed', 'cod_pending'],
-        is_ordered=True
-    )
-    
-    print(f" Updating analytics for {completed_orders.count()} completed orders")
-    
-    for order in completed_orders:
-        # Check if analytics were already updated (to avoid double counting)
-        order_items = order.items.filter(ordered=True)
-        
-        for item in order_items:
-            product = item.product
-            print(f" Adding analytics for {product.name}: +{item.quantity} orders, +Rs.{item.quantity * item.price} revenue")
-            
-            # Update order count
-            product.order_count = (product.order_count or 0) + item.quantity
-            
-            # Update revenue
-            item_revenue = item.quantity * item.price
-            product.total_revenue = (product.total_revenue or 0) + item_revenue
-            
-            product.save(update_fields=['order_count', 'total_revenue'])
\ No newline at end of file
+    # The sales ledger skips order items that were already recorded, so this never double counts
+    product_ids = backfill_sales_ledger()
+    logger.info(f"Sales ledger backfilled for {len(product_ids)} products")
+    return product_ids